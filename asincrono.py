@@ -0,0 +1,189 @@
+"""Cálculos desde asyncio sin bloquear el bucle de eventos.
+
+``calcular_en_tandas`` ejecuta un cálculo con el motor compilado en tandas
+de ``tanda`` pasos y cede el bucle entre una y otra, así que muchos
+cálculos avanzan intercalados en un mismo hilo sin que ninguno trabe a los
+demás. ``Calculadora`` agrega un límite de cálculos simultáneos y, con un
+``executor``, delega cada cálculo entero en hilos o procesos en lugar de
+cortarlo en tandas.
+
+    async with Calculadora(concurrencia=8) as calc:
+        seguimiento = calc.lanzar(300, 30, "*")
+        async for progreso in seguimiento:
+            print(progreso.pasos)
+        calculo = await seguimiento
+"""
+
+import argparse
+import asyncio
+import functools
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from calculadora import Calculo, armar_calculo, calcular, crear_cinta, motor_compartido
+from lotes import agregar_limites, formatear, leer_expresiones, leer_limites
+from motor import Control, EjecucionAbortada
+
+# pasos entre una cesión del bucle y la siguiente: alrededor de un milisegundo;
+# con n cálculos en curso el bucle puede tardar varias tandas de cada uno en atender
+# otra tarea
+TANDA = 1 << 13
+
+# ``llamadas`` es la pila de máquinas en curso, desde la principal
+Progreso = namedtuple("Progreso", ["pasos", "llamadas", "segundos"])
+
+
+async def calcular_en_tandas(num1, num2, operador, motor=None, tanda=TANDA, limites=None,
+                             progreso=None):
+    """Ejecuta un cálculo cediendo el bucle cada ``tanda`` pasos y devuelve el ``Calculo``.
+
+    La corrida usa la configuración de ``motor`` (o el compartido), como
+    ``calculadora.calcular``; ``limites``, si se dan, reemplazan a los del
+    motor. ``progreso``, si se da, se llama con un ``Progreso`` después de
+    cada tanda. Cancelar la tarea detiene el cálculo en la próxima cesión.
+    """
+    cinta = crear_cinta(num1, num2, operador)
+    inicio = time.perf_counter()
+    ejecucion = (motor or motor_compartido()).preparar(cinta, limites=limites)
+    try:
+        while not ejecucion.correr(tanda):
+            if progreso is not None:
+                progreso(Progreso(ejecucion.pasos, tuple(ejecucion.llamadas_en_curso()),
+                                  time.perf_counter() - inicio))
+            await asyncio.sleep(0)
+    except EjecucionAbortada as e:
+        return armar_calculo(num1, num2, operador, ejecucion, time.perf_counter() - inicio, e)
+    return armar_calculo(num1, num2, operador, ejecucion, time.perf_counter() - inicio)
+
+
+class Seguimiento:
+    """Un cálculo lanzado con ``Calculadora.lanzar``.
+
+    Se espera con ``await`` para obtener el ``Calculo``. Recorrerlo con
+    ``async for`` da el ``Progreso`` más reciente cada vez que cambia,
+    hasta que el cálculo termina; los intermedios que nadie llegó a leer
+    se descartan, así que un consumidor lento no acumula memoria.
+    """
+
+    def __init__(self):
+        self.progreso = None
+        self.tarea = None
+        self._cambio = asyncio.Event()
+
+    def _avisar(self, progreso):
+        self.progreso = progreso
+        self._cambio.set()
+
+    def __await__(self):
+        return self.tarea.__await__()
+
+    def cancelar(self):
+        self.tarea.cancel()
+
+    def __aiter__(self):
+        return self._seguir()
+
+    async def _seguir(self):
+        while not self.tarea.done():
+            cambio = asyncio.ensure_future(self._cambio.wait())
+            await asyncio.wait({cambio, self.tarea}, return_when=asyncio.FIRST_COMPLETED)
+            cambio.cancel()
+            if self._cambio.is_set():
+                self._cambio.clear()
+                yield self.progreso
+
+
+class Calculadora:
+    """Cálculos concurrentes desde asyncio, a lo sumo ``concurrencia`` a la vez.
+
+    Sin ``executor`` cada cálculo corre en el hilo del bucle en tandas de
+    ``tanda`` pasos. Con un ``executor`` de hilos o de procesos cada
+    cálculo corre entero con ``calculadora.calcular`` y no informa
+    progreso; con hilos, cancelar la tarea cancela también el cálculo, y
+    con procesos cada uno usa su motor compartido en lugar de ``motor``.
+    Los ``limites`` (unos ``motor.Limites``) se aplican a cada cálculo.
+    """
+
+    def __init__(self, concurrencia=8, tanda=TANDA, motor=None, limites=None, executor=None):
+        self.tanda = tanda
+        self.motor = motor
+        self.limites = limites
+        self.executor = executor
+        self._lugares = asyncio.Semaphore(concurrencia)
+
+    async def calcular(self, num1, num2, operador, progreso=None):
+        """Devuelve el ``Calculo``, esperando lugar si ya hay ``concurrencia`` en curso."""
+        async with self._lugares:
+            if self.executor is None:
+                return await calcular_en_tandas(num1, num2, operador, self.motor, self.tanda,
+                                                self.limites, progreso)
+            return await self._en_executor(num1, num2, operador)
+
+    async def _en_executor(self, num1, num2, operador):
+        bucle = asyncio.get_running_loop()
+        if isinstance(self.executor, ProcessPoolExecutor):
+            # un Control no cruza a otro proceso: el cálculo sigue aunque se cancele la tarea
+            trabajo = functools.partial(calcular, num1, num2, operador, limites=self.limites)
+            return await bucle.run_in_executor(self.executor, trabajo)
+        control = Control()
+        trabajo = functools.partial(calcular, num1, num2, operador, self.motor,
+                                    limites=self.limites, control=control)
+        try:
+            return await bucle.run_in_executor(self.executor, trabajo)
+        except asyncio.CancelledError:
+            control.cancelar()
+            raise
+
+    def lanzar(self, num1, num2, operador):
+        """Empieza un cálculo en una tarea y devuelve su ``Seguimiento``."""
+        seguimiento = Seguimiento()
+        seguimiento.tarea = asyncio.ensure_future(
+            self.calcular(num1, num2, operador, seguimiento._avisar))
+        return seguimiento
+
+    async def calcular_todos(self, expresiones):
+        """``Calculo`` de cada ``(num1, num2, operador)``, en el orden de entrada."""
+        return await asyncio.gather(*(self.calcular(*expresion) for expresion in expresiones))
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *excepcion):
+        if self.executor is not None:
+            # se espera a los trabajadores en otro hilo para no trabar el bucle
+            await asyncio.to_thread(self.executor.shutdown, cancel_futures=True)
+
+
+async def _principal(args):
+    executor = None
+    if args.hilos:
+        executor = ThreadPoolExecutor(args.hilos)
+    elif args.procesos:
+        executor = ProcessPoolExecutor(args.procesos)
+    async with Calculadora(args.concurrencia, args.tanda, limites=leer_limites(args),
+                           executor=executor) as calc:
+        expresiones = list(leer_expresiones(args.archivo))
+        # las líneas inválidas ya vienen como ``Calculo`` con el error
+        calculos = iter(await calc.calcular_todos(
+            [expresion for expresion in expresiones if not isinstance(expresion, Calculo)]))
+        for expresion in expresiones:
+            print(formatear(expresion if isinstance(expresion, Calculo) else next(calculos)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evalúa cálculos concurrentes con asyncio")
+    parser.add_argument("archivo", nargs="?", type=argparse.FileType("r"), default=sys.stdin,
+                        help="archivo con una expresión 'num1 num2 operador' por línea (por defecto stdin)")
+    parser.add_argument("-n", "--concurrencia", type=int, default=8,
+                        help="cálculos en curso a la vez")
+    parser.add_argument("-t", "--tanda", type=int, default=TANDA,
+                        help="pasos entre cesiones del bucle de eventos")
+    ejecutores = parser.add_mutually_exclusive_group()
+    ejecutores.add_argument("--hilos", type=int, default=0,
+                            help="corre cada cálculo entero en un pool de tantos hilos")
+    ejecutores.add_argument("-p", "--procesos", type=int, default=0,
+                            help="corre cada cálculo entero en un pool de tantos procesos")
+    agregar_limites(parser)
+    asyncio.run(_principal(parser.parse_args()))
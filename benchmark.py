@@ -0,0 +1,174 @@
+"""Benchmark de pasos y tiempo por operador y tamaño de operandos.
+
+Recorre largos en bits de los operandos para cada operador, ejecuta cada
+cálculo desde ``transiciones_iniciador`` con el motor compilado y registra
+pasos, llamadas a cada submáquina, largo máximo de la cinta y tiempo. Los
+resultados se escriben en JSON y pueden compararse con una corrida
+anterior guardada: cualquier cambio en los pasos o en el resultado es una
+regresión; el tiempo depende de la máquina, así que solo se informa
+cuando empeora más que la tolerancia (y falla únicamente con --estricto).
+
+    python benchmark.py -o actual.json --base benchmark_base.json
+"""
+
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+
+from calculadora import OPERADORES, crear_cinta, leer_resultado, motor_compartido
+from motor import Ejecucion
+
+# largos en bits recorridos por defecto: la multiplicación suma num1
+# num2 veces, así que crece mucho más rápido que las demás
+BITS = {"+": 12, "-": 12, "*": 7, "/": 12}
+
+ESPERADO = {
+    "+": lambda a, b: a + b,
+    "-": lambda a, b: a - b,
+    "*": lambda a, b: a * b,
+    "/": lambda a, b: a // b,
+}
+
+
+def _valores(bits, azar):
+    """El menor, el mayor y uno al azar entre los números de ``bits`` bits."""
+    menor, mayor = 1 << (bits - 1), (1 << bits) - 1
+    return sorted({menor, mayor, azar.randint(menor, mayor)})
+
+
+def casos(operadores=OPERADORES, bits=None, semilla=0):
+    """Genera ``(operador, bits, num1, num2)`` del recorrido.
+
+    ``num1`` tiene ``bits`` bits; ``num2`` tiene los mismos bits en la suma
+    y la multiplicación, y la mitad en la resta y la división, para que la
+    resta no quede negativa y el cociente no sea siempre 1.
+    """
+    azar = random.Random(semilla)
+    for operador in operadores:
+        maximo = bits or BITS[operador]
+        for n in range(1, maximo + 1):
+            n2 = n if operador in "+*" else max(1, n // 2)
+            for num1, num2 in zip(_valores(n, azar), _valores(n2, azar)):
+                yield operador, n, num1, num2
+
+
+def medir(operador, num1, num2, repeticiones=1):
+    """Ejecuta un cálculo y devuelve su registro; el tiempo es el mínimo de las repeticiones."""
+    cinta = crear_cinta(num1, num2, operador)
+    programa = motor_compartido().programa
+    segundos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        ejecucion = Ejecucion(programa, cinta)
+        ejecucion.correr()
+        segundos.append(time.perf_counter() - inicio)
+
+    resultado = ejecucion.resultado()
+    valor = leer_resultado(resultado.cinta)
+    return {
+        "operador": operador,
+        "num1": num1,
+        "num2": num2,
+        "valor": valor,
+        "correcto": valor == ESPERADO[operador](num1, num2),
+        "pasos": resultado.pasos,
+        "llamadas": ejecucion.llamadas_por_maquina(),
+        "pasos_por_maquina": ejecucion.pasos_por_maquina(),
+        # la cinta nunca se achica, así que su largo final es el máximo
+        "cinta_maxima": len(ejecucion.cinta),
+        "segundos": round(min(segundos), 6),
+    }
+
+
+def correr(operadores=OPERADORES, bits=None, repeticiones=3, semilla=0, progreso=None):
+    """Ejecuta todo el recorrido y devuelve el documento de resultados."""
+    registros = []
+    for operador, n, num1, num2 in casos(operadores, bits, semilla):
+        registro = medir(operador, num1, num2, repeticiones)
+        registro["bits"] = n
+        registros.append(registro)
+        if progreso is not None:
+            progreso(registro)
+    return {
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "repeticiones": repeticiones,
+        "semilla": semilla,
+        "resultados": registros,
+    }
+
+
+def comparar(actual, base, tolerancia=0.5):
+    """Compara dos documentos de ``correr`` y devuelve ``(diferencias, lentos)``.
+
+    ``diferencias`` lista los cálculos cuyo valor, pasos, llamadas o largo
+    de cinta cambiaron; ``lentos``, los que tardaron más que en la base en
+    más de ``tolerancia`` (proporción).
+    """
+    anteriores = {(r["operador"], r["num1"], r["num2"]): r for r in base["resultados"]}
+    diferencias = []
+    lentos = []
+    for registro in actual["resultados"]:
+        clave = (registro["operador"], registro["num1"], registro["num2"])
+        anterior = anteriores.get(clave)
+        if anterior is None:
+            continue
+        nombre = "%d %s %d" % (clave[1], clave[0], clave[2])
+        if not registro["correcto"]:
+            diferencias.append(f"{nombre}: resultado {registro['valor']} incorrecto")
+        for campo in ("valor", "pasos", "llamadas", "cinta_maxima"):
+            if registro[campo] != anterior[campo]:
+                diferencias.append(f"{nombre}: {campo} {anterior[campo]} -> {registro[campo]}")
+        # los cálculos muy cortos tienen demasiado ruido para compararlos
+        if anterior["segundos"] >= 0.01 and registro["segundos"] > anterior["segundos"] * (1 + tolerancia):
+            lentos.append(f"{nombre}: segundos {anterior['segundos']} -> {registro['segundos']}")
+    return diferencias, lentos
+
+
+def formatear(registro):
+    """Línea de resumen de un registro."""
+    marca = "" if registro["correcto"] else "  INCORRECTO"
+    return (f"{registro['operador']} {registro['bits']:>2} bits  {registro['num1']:>6} {registro['num2']:>6}"
+            f"  pasos {registro['pasos']:>10}  cinta {registro['cinta_maxima']:>5}"
+            f"  {registro['segundos']:.4f} s{marca}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de la calculadora por operador y tamaño")
+    parser.add_argument("-o", "--salida", default=None,
+                        help="archivo JSON donde guardar los resultados")
+    parser.add_argument("--base", default=None,
+                        help="resultados JSON de una corrida anterior con los que comparar")
+    parser.add_argument("--operadores", default="".join(OPERADORES),
+                        help="operadores a medir (por defecto '+-*/')")
+    parser.add_argument("--bits", type=int, default=None,
+                        help="largo máximo de los operandos en bits (por defecto según el operador)")
+    parser.add_argument("-r", "--repeticiones", type=int, default=3,
+                        help="corridas por cálculo; se guarda el menor tiempo")
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--tolerancia", type=float, default=0.5,
+                        help="empeoramiento de tiempo aceptado respecto de la base (proporción)")
+    parser.add_argument("--estricto", action="store_true",
+                        help="falla también si algún cálculo supera la tolerancia de tiempo")
+    args = parser.parse_args()
+
+    operadores = [operador for operador in args.operadores if operador in OPERADORES]
+    motor_compartido()
+    documento = correr(operadores, args.bits, args.repeticiones, args.semilla,
+                       progreso=lambda registro: print(formatear(registro)))
+    if args.salida:
+        with open(args.salida, "w") as archivo:
+            json.dump(documento, archivo, indent=1, ensure_ascii=False)
+
+    fallas = not all(registro["correcto"] for registro in documento["resultados"])
+    if args.base:
+        with open(args.base) as archivo:
+            diferencias, lentos = comparar(documento, json.load(archivo), args.tolerancia)
+        for linea in diferencias + lentos:
+            print(linea)
+        print(f"{len(diferencias)} diferencias y {len(lentos)} más lentos que {args.base}")
+        fallas = fallas or bool(diferencias) or args.estricto and bool(lentos)
+    sys.exit(1 if fallas else 0)
@@ -0,0 +1,179 @@
+"""Cálculos completos: armar la cinta, ejecutarla en el motor y leer el resultado."""
+
+import shelve
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from motor import EjecucionAbortada, Motor
+
+OPERADORES = ("+", "-", "*", "/")
+
+# ``error`` es None, el ``a_dict()`` de la ``EjecucionAbortada`` si se cortó por un límite,
+# o ``{"motivo": "invalido", "mensaje": ...}`` si la expresión no se pudo calcular
+Calculo = namedtuple("Calculo", ["num1", "num2", "operador", "valor", "cinta", "pasos", "estado",
+                                 "pasos_por_maquina", "segundos", "error"], defaults=(None,))
+
+_motor = None
+
+
+def motor_compartido():
+    """Motor compartido del proceso, compilado la primera vez que se pide."""
+    global _motor
+    if _motor is None:
+        _motor = Motor()
+    return _motor
+
+
+def crear_cinta(num1, num2, operador):
+    """Arma la cinta de entrada a partir de dos números decimales.
+
+    Los números pueden ser enteros o texto en decimal; cualquier otra cosa
+    (un float, un booleano) es un ValueError en lugar de truncarse.
+    """
+    for nombre, numero in (("num1", num1), ("num2", num2)):
+        if isinstance(numero, bool) or not isinstance(numero, (int, str)):
+            raise ValueError(f"{nombre} debe ser un entero: {numero!r}")
+    num1, num2 = int(num1), int(num2)
+    if num1 < 0 or num2 < 0:
+        raise ValueError("los números deben ser no negativos")
+    if operador not in OPERADORES:
+        raise ValueError(f"operador desconocido: {operador!r}")
+    return f" {num1:b} {num2:b} {operador} "
+
+
+def leer_resultado(cinta):
+    """Devuelve el número binario que queda a la derecha del operador, o None."""
+    simbolos = cinta.split()
+    for i, simbolo in enumerate(simbolos):
+        if simbolo in OPERADORES:
+            if i + 1 < len(simbolos) and simbolos[i + 1].strip("01") == "":
+                return int(simbolos[i + 1], 2)
+            return None
+    return None
+
+
+class CacheCalculos:
+    """Cache LRU de cálculos indexada por ``(num1, num2, operador)`` y el programa del motor.
+
+    Guarda a lo sumo ``capacidad`` resultados en memoria y desaloja el usado
+    hace más tiempo. Con ``archivo`` cada resultado se guarda además en un
+    ``shelve`` en disco, que se consulta cuando falta en memoria, así que la
+    cache sigue caliente entre ejecuciones; solo se guardan ahí los
+    cálculos de la calculadora compilada. Puede usarse desde varios hilos.
+    """
+
+    def __init__(self, capacidad=1024, archivo=None):
+        if capacidad < 1:
+            raise ValueError("la capacidad debe ser al menos 1")
+        self.capacidad = capacidad
+        self.aciertos = 0
+        self.aciertos_disco = 0
+        self.fallos = 0
+        self.desalojos = 0
+        self._calculos = OrderedDict()
+        self._disco = shelve.open(archivo) if archivo else None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def clave(num1, num2, operador, motor=None):
+        """Clave de un cálculo; ``motor`` solo cuenta si no corre la calculadora compilada."""
+        return int(num1), int(num2), operador, None if motor is None else motor.principal
+
+    def obtener(self, clave, max_pasos=None):
+        """Devuelve el ``Calculo`` guardado para ``clave``, o None.
+
+        Uno de más de ``max_pasos`` pasos no sirve con ese límite: se
+        devuelve None y cuenta como fallo.
+        """
+        with self._lock:
+            calculo = self._calculos.get(clave)
+            if calculo is not None:
+                if max_pasos is None or calculo.pasos <= max_pasos:
+                    self._calculos.move_to_end(clave)
+                    self.aciertos += 1
+                    return calculo
+            elif self._disco is not None and clave[3] is None:
+                calculo = self._disco.get("%d %d %s" % clave[:3])
+                if calculo is not None and (max_pasos is None or calculo.pasos <= max_pasos):
+                    self.aciertos_disco += 1
+                    self._agregar(clave, calculo)
+                    return calculo
+            self.fallos += 1
+            return None
+
+    def guardar(self, clave, calculo):
+        with self._lock:
+            self._agregar(clave, calculo)
+            if self._disco is not None and clave[3] is None:
+                self._disco["%d %d %s" % clave[:3]] = calculo
+
+    def _agregar(self, clave, calculo):
+        self._calculos[clave] = calculo
+        self._calculos.move_to_end(clave)
+        if len(self._calculos) > self.capacidad:
+            self._calculos.popitem(last=False)
+            self.desalojos += 1
+
+    def estadisticas(self):
+        with self._lock:
+            return {"aciertos": self.aciertos, "aciertos_disco": self.aciertos_disco,
+                    "fallos": self.fallos, "desalojos": self.desalojos,
+                    "tamaño": len(self._calculos), "capacidad": self.capacidad}
+
+    def cerrar(self):
+        """Cierra el archivo en disco, si hay uno."""
+        with self._lock:
+            if self._disco is not None:
+                self._disco.close()
+                self._disco = None
+
+
+def calcular(num1, num2, operador, motor=None, cache=None, limites=None, control=None):
+    """Ejecuta un cálculo completo con ``motor`` (o el compartido) y devuelve un ``Calculo``.
+
+    La corrida usa la memoria, los atajos, la validación y los límites del
+    motor; ``limites`` (unos ``motor.Limites``), si se dan, reemplazan a
+    los del motor. Un cálculo que los supera devuelve ``valor`` None y el
+    motivo en ``error``, y no se guarda en la cache; lo mismo pasa si se
+    cancela con ``control`` (un ``motor.Control``). Con ``cache`` (una
+    ``CacheCalculos``) se devuelve el resultado guardado si el mismo
+    cálculo ya se hizo con el mismo programa y no pasa el límite de pasos;
+    ``segundos`` es el de la corrida original.
+    """
+    motor = motor or motor_compartido()
+    if cache is not None:
+        clave = cache.clave(num1, num2, operador, motor)
+        efectivos = motor.limites if limites is None else limites
+        calculo = cache.obtener(clave, efectivos.pasos if efectivos is not None else None)
+        if calculo is None:
+            calculo = calcular(num1, num2, operador, motor, limites=limites, control=control)
+            if calculo.error is None:
+                cache.guardar(clave, calculo)
+        return calculo
+
+    cinta = crear_cinta(num1, num2, operador)
+    inicio = time.perf_counter()
+    ejecucion = motor.preparar(cinta, limites=limites, control=control)
+    try:
+        ejecucion.correr()
+    except EjecucionAbortada as e:
+        return armar_calculo(num1, num2, operador, ejecucion, time.perf_counter() - inicio, e)
+    return armar_calculo(num1, num2, operador, ejecucion, time.perf_counter() - inicio)
+
+
+def calculo_invalido(num1, num2, operador, mensaje):
+    """``Calculo`` sin ejecutar de una expresión inválida, con ``mensaje`` en ``error``."""
+    return Calculo(num1, num2, operador, None, None, 0, None, {}, 0.0,
+                   {"motivo": "invalido", "mensaje": mensaje})
+
+
+def armar_calculo(num1, num2, operador, ejecucion, segundos, abortada=None):
+    """``Calculo`` de una ``Ejecucion`` terminada, o cortada por la ``EjecucionAbortada`` dada."""
+    if abortada is not None:
+        return Calculo(int(num1), int(num2), operador, None, str(ejecucion.cinta), abortada.pasos,
+                       abortada.estado, ejecucion.pasos_por_maquina(), segundos, abortada.a_dict())
+    resultado = ejecucion.resultado()
+    return Calculo(int(num1), int(num2), operador, leer_resultado(resultado.cinta),
+                   resultado.cinta, resultado.pasos, resultado.estado,
+                   ejecucion.pasos_por_maquina(), segundos)
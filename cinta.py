@@ -0,0 +1,108 @@
+"""Cinta bidireccional de un byte por celda con crecimiento amortizado O(1)."""
+
+BLANCO = ord(' ')
+
+
+class Cinta:
+    """Cinta de celdas indexada por posiciones absolutas.
+
+    La celda 0 es la primera de la cinta inicial y las que se agregan a su
+    izquierda tienen posiciones negativas, así que la posición del cabezal
+    no cambia cuando la cinta crece hacia la izquierda. Las celdas usadas
+    son las de ``inicio`` a ``fin`` (sin incluir); se guardan como bytes en
+    el ``bytearray`` ``celdas`` desplazadas en ``origen``, con una reserva
+    de blancos a cada lado que se duplica cuando se agota.
+    """
+
+    __slots__ = ("celdas", "origen", "inicio", "fin")
+
+    def __init__(self, contenido=""):
+        if isinstance(contenido, str):
+            contenido = contenido.encode("ascii")
+        largo = len(contenido) or 1
+        self.inicio = 0
+        self.fin = largo
+        self.origen = largo
+        self.celdas = bytearray([BLANCO]) * (3 * largo)
+        self.celdas[largo:largo + len(contenido)] = contenido
+
+    def __len__(self):
+        return self.fin - self.inicio
+
+    def __str__(self):
+        return self.vista().tobytes().decode("ascii")
+
+    def __repr__(self):
+        return f"Cinta({str(self)!r}, inicio={self.inicio})"
+
+    def vista(self):
+        """Vista sin copia (``memoryview``) de las celdas usadas.
+
+        Si la cinta crece, la reserva se reubica y la vista queda con el
+        contenido anterior.
+        """
+        return memoryview(self.celdas)[self.origen + self.inicio:self.origen + self.fin]
+
+    def indice(self, posicion):
+        """Índice de una posición dentro de ``vista()``."""
+        return posicion - self.inicio
+
+    def extender(self, posicion):
+        """Incorpora ``posicion`` a las celdas usadas, agrandando la reserva si hace falta.
+
+        La reserva nueva es otro ``bytearray``, así que las vistas tomadas
+        antes siguen siendo válidas y ``celdas`` debe volver a leerse.
+        """
+        if posicion < self.inicio:
+            faltan = -(self.origen + posicion)
+            if faltan > 0:
+                extra = max(faltan, len(self.celdas))
+                self.celdas = bytearray([BLANCO]) * extra + self.celdas
+                self.origen += extra
+            self.inicio = posicion
+        elif posicion >= self.fin:
+            faltan = self.origen + posicion + 1 - len(self.celdas)
+            if faltan > 0:
+                self.celdas = self.celdas + bytes([BLANCO]) * max(faltan, len(self.celdas))
+            self.fin = posicion + 1
+
+    def leer(self, desde, hasta):
+        """Bytes de las posiciones ``desde`` a ``hasta`` (sin incluir).
+
+        Las posiciones fuera de las celdas usadas se leen como blancos, sin
+        extender la cinta.
+        """
+        a, b = max(desde, self.inicio), min(hasta, self.fin)
+        if a >= b:
+            return bytes([BLANCO]) * (hasta - desde)
+        return (bytes([BLANCO]) * (a - desde)
+                + self.celdas[self.origen + a:self.origen + b]
+                + bytes([BLANCO]) * (hasta - b))
+
+    def escribir(self, desde, datos):
+        """Escribe ``datos`` a partir de ``desde``, extendiendo la cinta si hace falta."""
+        self.extender(desde)
+        self.extender(desde + len(datos) - 1)
+        i = self.origen + desde
+        self.celdas[i:i + len(datos)] = datos
+
+    def instantanea(self):
+        """Copia de las celdas usadas y de su posición, para ``restaurar``."""
+        return self.inicio, bytes(self.vista())
+
+    def restaurar(self, instantanea):
+        """Vuelve la cinta al contenido de una ``instantanea``."""
+        inicio, contenido = instantanea
+        largo = len(contenido)
+        self.celdas = bytearray([BLANCO]) * (3 * largo)
+        self.celdas[largo:2 * largo] = contenido
+        self.origen = largo - inicio
+        self.inicio = inicio
+        self.fin = inicio + largo
+
+    def copiar(self):
+        """Devuelve una cinta independiente con el mismo contenido."""
+        copia = Cinta.__new__(Cinta)
+        copia.celdas = bytearray(self.celdas)
+        copia.origen, copia.inicio, copia.fin = self.origen, self.inicio, self.fin
+        return copia
@@ -0,0 +1,238 @@
+"""Compila las tablas de transiciones a una forma indexada por enteros.
+
+Cada estado de una máquina y cada símbolo de la cinta se reemplaza por un
+entero chico, y la tabla de la máquina pasa a ser una lista plana indexada
+por ``estado * ANCHO + simbolo`` cuyas entradas son tuplas
+``(nuevo_estado, escribir, mover, destino)`` o ``None`` si no hay
+transición. ``destino`` es el ``Barrido`` de un movimiento ``BARRIDO`` o
+la ``MaquinaCompilada`` de una ``LLAMADA``, y ``None`` en otro caso.
+
+La cinta guarda cada símbolo como un byte; ``CODIGOS[byte]`` da el código
+del símbolo y ``escribir`` es directamente el byte a escribir.
+"""
+
+import re
+
+from contadores import atajo
+from transiciones import maquinas, iniciador
+
+R = 1
+L = -1
+N = 0
+BARRIDO = 2
+LLAMADA = 3
+SIN_ESCRITURA = -1
+
+MOVIMIENTOS = {"R": R, "L": L, "N": N}
+
+
+def _alfabeto(tablas):
+    simbolos = set()
+    for transiciones in tablas:
+        for (_, simbolo), (_, escribir, _) in transiciones.items():
+            simbolos.add(simbolo)
+            if escribir != 'n':
+                simbolos.add(escribir)
+    simbolos.discard(' ')
+    # el blanco siempre tiene el código 0
+    return (' ',) + tuple(sorted(simbolos))
+
+
+ALFABETO = _alfabeto(t for _, t, _, _ in [iniciador, *maquinas.values()])
+
+# los bytes fuera del alfabeto caen en una última columna sin transiciones
+ANCHO = len(ALFABETO) + 1
+CODIGOS = bytes(
+    ALFABETO.index(chr(b)) if chr(b) in ALFABETO else len(ALFABETO)
+    for b in range(256))
+
+
+class Barrido:
+    """Lazo de un estado sobre sí mismo que solo mueve el cabezal.
+
+    Mientras el símbolo leído esté en ``simbolos`` la máquina avanza en la
+    misma dirección sin escribir ni cambiar de estado, así que el recorrido
+    entero se resuelve buscando el primer byte que no esté en el conjunto.
+    """
+
+    __slots__ = ("simbolos", "derecha", "patron", "sigue")
+
+    # los recorridos cortos se resuelven celda por celda, que sale más
+    # barato que una búsqueda con re
+    CORTO = 16
+
+    def __init__(self, simbolos, derecha):
+        self.simbolos = frozenset(simbolos)
+        self.derecha = derecha
+        clase = re.escape("".join(sorted(self.simbolos)).encode("ascii"))
+        self.patron = re.compile(b"[^" + clase + b"]")
+
+    def buscar(self, celdas, desde, limite):
+        """Índice en ``celdas`` donde termina el recorrido, o -1.
+
+        Hacia la derecha busca en ``[desde, limite)``; hacia la izquierda,
+        de ``desde`` hacia atrás hasta ``limite`` inclusive.
+        """
+        if self.derecha:
+            m = self.patron.search(celdas, desde, limite)
+            return m.start() if m else -1
+
+        # re no busca hacia atrás: se invierten tramos de tamaño creciente
+        fin = desde + 1
+        tramo = 64
+        while fin > limite:
+            inicio = max(limite, fin - tramo)
+            m = self.patron.search(celdas[inicio:fin][::-1])
+            if m:
+                return fin - 1 - m.start()
+            fin = inicio
+            tramo *= 2
+        return -1
+
+    def __repr__(self):
+        direccion = "R" if self.derecha else "L"
+        return f"<Barrido {direccion} {''.join(sorted(self.simbolos))!r}>"
+
+
+def _barridos(transiciones):
+    """Agrupa los lazos ``(estado, simbolo) -> (estado, 'n', R|L)`` por estado y dirección."""
+    lazos = {}
+    for (estado, simbolo), (nuevo_estado, escribir, mover) in transiciones.items():
+        if nuevo_estado == estado and escribir in ('n', simbolo) and mover in ("R", "L"):
+            lazos.setdefault((estado, mover), set()).add(simbolo)
+    return {clave: Barrido(simbolos, clave[1] == "R") for clave, simbolos in lazos.items()}
+
+
+class MaquinaCompilada:
+    """Tabla de una máquina con estados y símbolos codificados como enteros.
+
+    Con ``barridos`` los lazos de recorrido se compilan como movimientos
+    ``BARRIDO`` que el motor resuelve en una sola operación.
+    """
+
+    __slots__ = ("nombre", "transiciones", "estados", "estado_inicial", "estado_final", "tabla")
+
+    def __init__(self, nombre, transiciones, estado_inicial, estado_final, barridos=True):
+        indices = {estado_inicial: 0}
+        indices.setdefault(estado_final, 1)
+        for (estado, _), (nuevo_estado, _, _) in transiciones.items():
+            indices.setdefault(estado, len(indices))
+            indices.setdefault(nuevo_estado, len(indices))
+
+        lazos = _barridos(transiciones) if barridos else {}
+        tabla = [None] * (len(indices) * ANCHO)
+        for (estado, simbolo), (nuevo_estado, escribir, mover) in transiciones.items():
+            barrido = lazos.get((estado, mover))
+            escribir = SIN_ESCRITURA if escribir == 'n' else ord(escribir)
+            if barrido is not None and simbolo in barrido.simbolos:
+                entrada = (indices[estado], SIN_ESCRITURA, BARRIDO, barrido)
+            elif mover in MOVIMIENTOS:
+                entrada = (indices[nuevo_estado], escribir, MOVIMIENTOS[mover], None)
+            else:
+                # el nombre se resuelve a la MaquinaCompilada en compilar()
+                entrada = (indices[nuevo_estado], escribir, LLAMADA, mover)
+            tabla[indices[estado] * ANCHO + CODIGOS[ord(simbolo)]] = entrada
+
+        self.nombre = nombre
+        self.transiciones = transiciones
+        self.estados = tuple(indices)
+        self.estado_inicial = indices[estado_inicial]
+        self.estado_final = indices[estado_final]
+        self.tabla = tabla
+
+    def __repr__(self):
+        return f"<MaquinaCompilada {self.nombre}>"
+
+
+def compilar(submaquinas=maquinas, principal=iniciador, barridos=True):
+    """Compila la máquina principal y todas las submáquinas.
+
+    Las llamadas a submáquinas se resuelven a la ``MaquinaCompilada``
+    correspondiente; devuelve la máquina principal.
+    """
+    compiladas = {llamada: MaquinaCompilada(*spec, barridos=barridos)
+                  for llamada, spec in submaquinas.items()}
+    raiz = MaquinaCompilada(*principal, barridos=barridos)
+
+    for maquina in [raiz, *compiladas.values()]:
+        for i, entrada in enumerate(maquina.tabla):
+            if entrada is None or entrada[2] != LLAMADA:
+                continue
+            if entrada[3] not in compiladas:
+                raise ValueError(f"{maquina.nombre}: submáquina desconocida {entrada[3]!r}")
+            maquina.tabla[i] = entrada[:3] + (compiladas[entrada[3]],)
+
+    for maquina in [raiz, *compiladas.values()]:
+        maquina.tabla = tuple(maquina.tabla)
+    return raiz
+
+
+class Programa:
+    """Todas las máquinas enlazadas en una sola tabla.
+
+    Un ``Programa`` no cambia después de construirse, así que puede
+    compartirse entre hilos y ejecuciones simultáneas; el estado de cada
+    corrida vive en ``motor.Ejecucion``.
+
+    Los estados de cada máquina se numeran a continuación de los de la
+    anterior (``desplazamientos``), así que un estado global identifica la
+    máquina y su estado local. Las entradas de ``LLAMADA`` quedan como
+    ``(estado_de_retorno, escribir, LLAMADA, estado_inicial_de_la_submaquina)``:
+    el motor apila el estado de retorno y salta al inicio de la submáquina.
+    Las filas de los estados finales quedan vacías, así que llegar a uno se
+    trata igual que quedarse sin transición: se vuelve al estado apilado.
+    """
+
+    __slots__ = ("maquinas", "desplazamientos", "tabla", "estado_inicial",
+                 "estado_final", "maquina_de_estado", "nombres_estado", "hojas", "atajos")
+
+    def __init__(self, raiz):
+        maquinas = [raiz]
+        for maquina in maquinas:
+            for entrada in maquina.tabla:
+                if entrada is not None and entrada[2] == LLAMADA and entrada[3] not in maquinas:
+                    maquinas.append(entrada[3])
+
+        desplazamientos = {}
+        total = 0
+        for maquina in maquinas:
+            desplazamientos[maquina] = total
+            total += len(maquina.estados)
+
+        tabla = []
+        maquina_de_estado = []
+        nombres_estado = []
+        for i, maquina in enumerate(maquinas):
+            base = desplazamientos[maquina]
+            for entrada in maquina.tabla:
+                if entrada is None:
+                    tabla.append(None)
+                elif entrada[2] == LLAMADA:
+                    destino = entrada[3]
+                    tabla.append((base + entrada[0], entrada[1], LLAMADA,
+                                  desplazamientos[destino] + destino.estado_inicial))
+                else:
+                    tabla.append((base + entrada[0],) + entrada[1:])
+            final = (base + maquina.estado_final) * ANCHO
+            tabla[final:final + ANCHO] = [None] * ANCHO
+            maquina_de_estado.extend([i] * len(maquina.estados))
+            nombres_estado.extend((maquina.nombre, estado) for estado in maquina.estados)
+
+        self.maquinas = tuple(maquinas)
+        self.desplazamientos = tuple(desplazamientos[m] for m in maquinas)
+        self.tabla = tuple(tabla)
+        self.estado_inicial = raiz.estado_inicial
+        self.estado_final = raiz.estado_final
+        self.maquina_de_estado = tuple(maquina_de_estado)
+        self.nombres_estado = tuple(nombres_estado)
+        # máquinas que no llaman a ninguna submáquina
+        self.hojas = tuple(
+            all(entrada is None or entrada[2] != LLAMADA for entrada in maquina.tabla)
+            for maquina in maquinas)
+        # funciones de ``contadores`` que reemplazan a una máquina, o None
+        self.atajos = tuple(atajo(maquina) for maquina in maquinas)
+
+
+def enlazar(raiz):
+    """Aplana la máquina principal y sus submáquinas en un ``Programa``."""
+    return Programa(raiz)
@@ -0,0 +1,113 @@
+"""Atajos nativos para el Incrementador y el Decrementador.
+
+Las dos máquinas recorren el número hacia la derecha hasta el blanco y
+después propagan el acarreo (o el préstamo) hacia la izquierda. Aquí se
+hace la misma operación directamente sobre los bytes de la cinta y se
+calcula la cantidad exacta de pasos que daría la tabla, incluidos los
+casos en que la máquina se detiene sin llegar a su estado final.
+
+Cada atajo recibe la ``Cinta`` y la posición del cabezal al entrar y
+devuelve ``(cabezal, pasos)``, dejando la cinta igual que la tabla
+(también las celdas que agrega al recorrerla).
+"""
+
+import re
+
+from cinta import BLANCO
+from transiciones import transiciones_decrementador, transiciones_incrementador
+
+CERO = ord('0')
+UNO = ord('1')
+
+_NO_BIT = re.compile(b"[^01]")
+
+
+def incrementar(cinta, cabezal):
+    """Suma uno al número que empieza en ``cabezal``, como ``transiciones_incrementador``."""
+    celdas, origen = cinta.celdas, cinta.origen
+    m = _NO_BIT.search(celdas, origen + cabezal, origen + cinta.fin)
+    if m is None:
+        fin = cinta.fin
+        cinta.extender(fin)
+        celdas, origen = cinta.celdas, cinta.origen
+    else:
+        fin = m.start() - origen
+        if celdas[origen + fin] != BLANCO:
+            return fin, fin - cabezal
+
+    # s1/s3 propagan el acarreo sobre los unos finales
+    i = origen + fin - 1
+    limite = origen + cinta.inicio
+    while i >= limite and celdas[i] == UNO:
+        celdas[i] = CERO
+        i -= 1
+    z = i - origen
+    unos = fin - 1 - z
+    pasos = fin - cabezal + 1 + 2 * unos
+    if z < cinta.inicio:
+        cinta.extender(z)
+        celdas, origen = cinta.celdas, cinta.origen
+    simbolo = celdas[origen + z]
+
+    if simbolo == CERO:
+        celdas[origen + z] = UNO
+        return z, pasos + 1
+    if simbolo == BLANCO and unos:
+        # acarreo hasta el principio: el blanco pasa a 1 y el cabezal sigue a la izquierda
+        celdas[origen + z] = UNO
+        if z - 1 < cinta.inicio:
+            cinta.extender(z - 1)
+        return z - 1, pasos
+    # la máquina se detiene sin llegar al estado final
+    return z, pasos - 1 if unos else pasos
+
+
+def decrementar(cinta, cabezal):
+    """Resta uno al número que empieza en ``cabezal``, como ``transiciones_decrementador``."""
+    celdas, origen = cinta.celdas, cinta.origen
+    m = _NO_BIT.search(celdas, origen + cabezal, origen + cinta.fin)
+    if m is None:
+        fin = cinta.fin
+        cinta.extender(fin)
+        celdas, origen = cinta.celdas, cinta.origen
+    else:
+        fin = m.start() - origen
+        if celdas[origen + fin] != BLANCO:
+            return fin, fin - cabezal
+
+    # s1 presta sobre los ceros finales
+    i = origen + fin - 1
+    limite = origen + cinta.inicio
+    while i >= limite and celdas[i] == CERO:
+        celdas[i] = UNO
+        i -= 1
+    z = i - origen
+    pasos = fin - cabezal + 1 + (fin - 1 - z)
+    if z < cinta.inicio:
+        cinta.extender(z)
+        celdas, origen = cinta.celdas, cinta.origen
+    simbolo = celdas[origen + z]
+
+    if simbolo == UNO:
+        celdas[origen + z] = CERO
+        return z, pasos + 1
+    if simbolo == BLANCO:
+        return z, pasos + 1
+    return z, pasos
+
+
+# tabla, estado inicial y estado final que reemplaza cada atajo
+_ATAJOS = (
+    (transiciones_incrementador, "s0", "s2", incrementar),
+    (transiciones_decrementador, "s0", "s2", decrementar),
+)
+
+
+def atajo(maquina):
+    """Atajo equivalente a una ``MaquinaCompilada``, o None si no hay."""
+    for transiciones, inicial, final, funcion in _ATAJOS:
+        if (maquina.transiciones == transiciones
+                and maquina.estados[maquina.estado_inicial] == inicial
+                and maquina.estados[maquina.estado_final] == final):
+            return funcion
+    return None
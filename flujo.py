@@ -0,0 +1,168 @@
+"""Pipeline en flujo para trabajos de cálculo en JSONL o CSV.
+
+Los trabajos se leen de a una línea, se ejecutan y los resultados se
+escriben apenas están listos, así que la memoria usada no depende del
+tamaño de la entrada. Cada trabajo tiene ``num1``, ``num2`` y
+``operador``; cualquier otro campo (por ejemplo ``id``) se copia tal cual
+al resultado.
+
+Entrada JSONL: un objeto por línea, ``{"num1": 6, "num2": 3, "operador": "/"}``.
+Entrada CSV: con encabezado ``num1,num2,operador``.
+"""
+
+import argparse
+import csv
+import itertools
+import json
+import sys
+
+from calculadora import CacheCalculos, Calculo, calcular, calculo_invalido, crear_cinta
+from lotes import agregar_limites, evaluar_lote, leer_limites
+
+CAMPOS = ("num1", "num2", "operador")
+
+
+def _leer_jsonl(lineas):
+    for numero, linea in enumerate(lineas, 1):
+        if not linea.strip():
+            continue
+        try:
+            trabajo = json.loads(linea)
+        except json.JSONDecodeError as e:
+            yield numero, calculo_invalido(None, None, None, f"línea {numero}: JSON inválido: {e}")
+            continue
+        if not isinstance(trabajo, dict):
+            trabajo = calculo_invalido(None, None, None, f"línea {numero}: se esperaba un objeto JSON")
+        yield numero, trabajo
+
+
+def _leer_csv(lineas):
+    for numero, trabajo in enumerate(csv.DictReader(lineas), 2):
+        yield numero, trabajo
+
+
+def leer_trabajos(lineas, formato="jsonl"):
+    """Genera un diccionario por trabajo leído de ``lineas`` (``"jsonl"`` o ``"csv"``).
+
+    Por una línea que no es un objeto JSON se genera en su lugar un
+    ``Calculo`` con el error y el número de línea, y la lectura sigue; los
+    trabajos incompletos o inválidos se generan igual y salen con ``error``.
+    """
+    lector = {"jsonl": _leer_jsonl, "csv": _leer_csv}[formato]
+    for _, trabajo in lector(lineas):
+        yield trabajo
+
+
+def validar_trabajo(trabajo):
+    """Levanta ValueError si ``trabajo`` no es un objeto con ``CAMPOS`` calculables."""
+    if not isinstance(trabajo, dict):
+        raise ValueError("cada trabajo debe ser un objeto JSON")
+    faltan = [campo for campo in CAMPOS if campo not in trabajo]
+    if faltan:
+        raise ValueError(f"faltan los campos {', '.join(faltan)}")
+    crear_cinta(trabajo["num1"], trabajo["num2"], trabajo["operador"])
+
+
+def _invalido(trabajo):
+    """``Calculo`` con el error si el trabajo no se puede calcular, o None."""
+    if isinstance(trabajo, Calculo):
+        return trabajo
+    try:
+        validar_trabajo(trabajo)
+    except ValueError as e:
+        return calculo_invalido(trabajo.get("num1"), trabajo.get("num2"), trabajo.get("operador"),
+                                str(e))
+    return None
+
+
+def ejecutar_trabajos(trabajos, procesos=1, tam_bloque=64, cache=None, limites=None):
+    """Genera ``(trabajo, Calculo)`` en el orden de entrada.
+
+    Con ``procesos`` mayor que 1 los cálculos se reparten con
+    ``lotes.evaluar_lote``; solo se retienen los trabajos en vuelo. La
+    ``cache`` (una ``CacheCalculos``) solo se usa con un proceso; con más,
+    cada proceso arma la suya en memoria con la misma capacidad. Los
+    ``limites`` (unos ``motor.Limites``) se aplican a cada cálculo. Un
+    trabajo inválido sale con un ``Calculo`` sin valor y el mensaje en
+    ``error``, sin cortar el flujo.
+    """
+    if procesos == 1:
+        for trabajo in trabajos:
+            yield _original(trabajo), _invalido(trabajo) or calcular(
+                trabajo["num1"], trabajo["num2"], trabajo["operador"], cache=cache, limites=limites)
+        return
+
+    trabajos, copia = itertools.tee(trabajos)
+    # ``evaluar_lote`` deja pasar tal cual los ``Calculo`` de los trabajos inválidos
+    expresiones = (_invalido(t) or (t["num1"], t["num2"], t["operador"]) for t in copia)
+    capacidad = cache.capacidad if cache is not None else 0
+    for trabajo, calculo in zip(trabajos, evaluar_lote(expresiones, procesos, tam_bloque,
+                                                       capacidad, limites)):
+        yield _original(trabajo), calculo
+
+
+def _original(trabajo):
+    # una línea ilegible no tiene campos que copiar al registro
+    return {} if isinstance(trabajo, Calculo) else trabajo
+
+
+def a_registro(trabajo, calculo):
+    """Diccionario de salida con el trabajo original y su resultado."""
+    registro = {campo: valor for campo, valor in trabajo.items() if campo not in CAMPOS}
+    registro.update(
+        num1=calculo.num1,
+        num2=calculo.num2,
+        operador=calculo.operador,
+        valor=calculo.valor,
+        cinta=calculo.cinta,
+        estado=calculo.estado,
+        pasos=calculo.pasos,
+        pasos_por_maquina=calculo.pasos_por_maquina,
+        segundos=round(calculo.segundos, 6),
+    )
+    if calculo.error is not None:
+        registro["error"] = calculo.error
+    return registro
+
+
+def escribir_jsonl(registros, salida):
+    """Escribe un registro JSON por línea, vaciando el buffer tras cada uno."""
+    for registro in registros:
+        salida.write(json.dumps(registro, ensure_ascii=False) + "\n")
+        salida.flush()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ejecuta trabajos de cálculo en flujo (JSONL o CSV)")
+    parser.add_argument("entrada", nargs="?", type=argparse.FileType("r"), default=sys.stdin,
+                        help="archivo de trabajos (por defecto stdin)")
+    parser.add_argument("-o", "--salida", type=argparse.FileType("w"), default=sys.stdout,
+                        help="archivo JSONL de resultados (por defecto stdout)")
+    parser.add_argument("-f", "--formato", choices=["jsonl", "csv"], default=None,
+                        help="formato de entrada (por defecto según la extensión, o jsonl)")
+    parser.add_argument("-p", "--procesos", type=int, default=1,
+                        help="procesos para repartir los cálculos (por defecto 1)")
+    parser.add_argument("-b", "--bloque", type=int, default=64,
+                        help="trabajos por bloque enviado a cada proceso")
+    parser.add_argument("-c", "--cache", type=int, default=0,
+                        help="resultados guardados en la cache LRU (0 la desactiva)")
+    parser.add_argument("--cache-archivo", default=None,
+                        help="archivo shelve donde persistir la cache (solo con un proceso)")
+    agregar_limites(parser)
+    args = parser.parse_args()
+    if args.cache_archivo and args.procesos != 1:
+        parser.error("--cache-archivo solo se puede usar con un proceso (-p 1)")
+    if args.cache_archivo and not args.cache:
+        parser.error("--cache-archivo necesita una cache en memoria (-c)")
+
+    cache = CacheCalculos(args.cache, args.cache_archivo) if args.cache else None
+    formato = args.formato or ("csv" if args.entrada.name.endswith(".csv") else "jsonl")
+    trabajos = leer_trabajos(args.entrada, formato)
+    resultados = ejecutar_trabajos(trabajos, args.procesos, args.bloque, cache, leer_limites(args))
+    try:
+        escribir_jsonl((a_registro(t, c) for t, c in resultados), args.salida)
+    finally:
+        if cache is not None:
+            if args.procesos == 1:
+                print(f"cache: {cache.estadisticas()}", file=sys.stderr)
+            cache.cerrar()
@@ -1,107 +1,42 @@
 import time
 import tkinter as tk
-from tkinter import ttk, messagebox
+from tkinter import ttk, messagebox, filedialog
 import threading
 
-from transiciones import (
-    transiciones_incrementador, transiciones_decrementador, transiciones_sumador,
-    transiciones_copiar_en_resultado, transiciones_iniciador, transiciones_mover_resultado,
-    transiciones_restador, transiciones_copiar_al_inicio, transiciones_multiplicador,
-    transiciones_recargar_operador, transiciones_divisor, transiciones_sumador_inicio,
-    transiciones_restador_inicio,
-)
-
-class MaquinaTuring:
-    submaquinas_globales = {}
-
-    def __init__(self, cinta, transiciones, estado_inicial, estado_final, nombre="Main", submaquinas=None):
-        self.cinta = list(cinta)
-        self.transiciones = transiciones
-        self.estado_inicial = estado_inicial
-        self.estado = estado_inicial
-        self.estado_final = estado_final
-        self.cabezal = 0
-        self.submaquinas = submaquinas or {}
-        self.nombre = nombre
-        self.callback_paso = None
-        self.delay = 0.1
-        self.running_flag = None
-
-    def set_callback_paso(self, callback):
-        self.callback_paso = callback
-
-    def set_delay(self, delay):
-        self.delay = delay
-
-    def paso(self):
-        simbolo = self.cinta[self.cabezal]
-        clave = (self.estado, simbolo)
-
-        if clave not in self.transiciones:
-            return False
-
-        nuevo_estado, escribir, mover = self.transiciones[clave]
-
-        if escribir != 'n':
-            self.cinta[self.cabezal] = escribir
-
-        self.estado = nuevo_estado
-
-        if self.callback_paso:
-            self.callback_paso(self)
-
-        if mover == "R":
-            self.cabezal += 1
-        elif mover == "L":
-            self.cabezal -= 1
-        elif mover == "N":
-            pass
-        else:
-            resultado = self.llamar_submaquina(mover)
-            return resultado
-
-        if self.cabezal >= len(self.cinta):
-            self.cinta.append(' ')
-        elif self.cabezal < 0:
-            self.cinta.insert(0, ' ')
-            self.cabezal = 0
-
-        return True
-
-    def llamar_submaquina(self, mover):
-        if mover in self.submaquinas:
-            submaquina = self.submaquinas[mover]
-        else:
-            submaquina = MaquinaTuring.submaquinas_globales.get(mover, None)
+from calculadora import motor_compartido
+from motor import Avisos, Control, Ejecucion, EjecucionAbortada, PuntosDeControl
+from traza import Reproductor, Traza, grabar
 
-        if submaquina is None:
-            return False
+# la pantalla se redibuja a lo sumo una vez por cuadro (~60 Hz), sin
+# importar cuántos pasos dé la máquina entre cuadros
+CUADRO_MS = 16
+ANCHO_CELDA = 40
+# cada cuánto se recalcula la lectura de pasos por segundo
+VENTANA_VELOCIDAD = 0.5
+# pasos entre puntos de control al retroceder: volver un paso simula a lo sumo estos
+INTERVALO_PUNTOS = 1000
 
-        submaquina.cinta = self.cinta
-        submaquina.cabezal = self.cabezal
-        submaquina.estado = submaquina.estado_inicial
+class VistaEjecucion:
+    """Presenta una ``motor.Ejecucion`` con los atributos que dibuja la GUI."""
 
-        if self.callback_paso:
-            submaquina.set_callback_paso(self.callback_paso)
-        submaquina.set_delay(self.delay)
+    def __init__(self, ejecucion):
+        self.ejecucion = ejecucion
 
-        resultado = submaquina.ejecutar(delay=self.delay)
-        if not resultado:
-            return False
+    @property
+    def cinta(self):
+        return self.ejecucion.cinta
 
-        self.cinta = submaquina.cinta
-        self.cabezal = submaquina.cabezal
+    @property
+    def cabezal(self):
+        return self.ejecucion.cabezal
 
-        return True
+    @property
+    def nombre(self):
+        return self.ejecucion.programa.nombres_estado[self.ejecucion.estado][0]
 
-    def ejecutar(self, delay=0.1):
-        while self.estado != self.estado_final:
-            if self.running_flag and not self.running_flag():
-                return False
-            if not self.paso():
-                break
-            time.sleep(delay)
-        return True
+    @property
+    def estado(self):
+        return self.ejecucion.programa.nombres_estado[self.ejecucion.estado][1]
 
 
 class TuringMachineGUI:
@@ -112,14 +47,42 @@ class TuringMachineGUI:
 
         self.maquina_actual = None
         self.running = False
+        # el Control de la corrida en curso: Detener la cancela
+        self.control = None
         self.step_count = 0
+        self.dirty = False
+
+        # valores de los controles leídos en el hilo de Tk para que el hilo
+        # de la máquina no toque variables de Tk
+        self.delay = 0.5
+        self.mode = "Normal"
+        self.turbo_steps = 1000
+        self.skipping = False
+        # reproducción de una traza grabada; mientras hay una, maquina_actual es el Reproductor
+        self.reproductor = None
+        # la ejecución en curso (una VistaEjecucion) y sus puntos de control para retroceder
+        self.stepper = None
+        self.checkpoints = None
+        self.rate_time = time.perf_counter()
+        self.rate_steps = 0
+        # el contador de pasos se actualiza una vez por cuadro aunque el
+        # motor corra sin pausas
+        self.progress = Avisos().cada_segundos(CUADRO_MS / 1000, self.on_progress)
+
+        # solo se dibujan las celdas visibles: un item por casilla de la
+        # ventana, que muestra la posición view_start + i de la cinta
+        self.cell_items = []
+        self.drawn = []
+        self.view_start = 0
+        self.head_items = None
 
         self.setup_gui()
-        self.initialize_submachines()
          
         self.root.columnconfigure(0, weight=1)
         self.root.rowconfigure(0, weight=1)
 
+        self.refresh_loop()
+
     def setup_gui(self):
         main_frame = ttk.Frame(self.root, padding="10")
         main_frame.grid(row=0, column=0, sticky="nsew")
@@ -152,6 +115,9 @@ class TuringMachineGUI:
         self.start_button = ttk.Button(button_frame, text="Iniciar", command=self.start_execution)
         self.start_button.grid(row=0, column=0, padx=5)
 
+        self.back_button = ttk.Button(button_frame, text="◀ Paso", command=self.step_back)
+        self.back_button.grid(row=0, column=11, padx=5)
+
         self.step_button = ttk.Button(button_frame, text="Paso", command=self.step_execution)
         self.step_button.grid(row=0, column=1, padx=5)
 
@@ -167,6 +133,19 @@ class TuringMachineGUI:
                                     orient=tk.HORIZONTAL, length=120)
         self.speed_scale.grid(row=0, column=5, padx=5)
 
+        ttk.Label(button_frame, text="Modo:").grid(row=0, column=6, padx=(20, 5))
+        self.mode_var = tk.StringVar(value="Normal")
+        ttk.Combobox(button_frame, textvariable=self.mode_var, values=("Normal", "Turbo"),
+                     state="readonly", width=8).grid(row=0, column=7, padx=5)
+
+        ttk.Label(button_frame, text="Pasos por cuadro:").grid(row=0, column=8, padx=(10, 5))
+        self.turbo_var = tk.IntVar(value=1000)
+        ttk.Spinbox(button_frame, from_=1, to=1000000, increment=100, textvariable=self.turbo_var,
+                    width=8).grid(row=0, column=9, padx=5)
+
+        self.skip_button = ttk.Button(button_frame, text="Saltar al final", command=self.skip_to_end)
+        self.skip_button.grid(row=0, column=10, padx=5)
+
         machine_frame = ttk.LabelFrame(main_frame, text="Ejecución", padding="5")
         machine_frame.grid(row=2, column=0, columnspan=2, sticky="ew")
 
@@ -182,35 +161,37 @@ class TuringMachineGUI:
         self.steps_label = ttk.Label(machine_frame, text="0", font=("Arial", 10, "bold"))
         self.steps_label.grid(row=0, column=5)
 
+        ttk.Label(machine_frame, text="Pasos/s:").grid(row=0, column=6, sticky=tk.W, padx=(20, 5))
+        self.rate_label = ttk.Label(machine_frame, text="---", font=("Arial", 10, "bold"))
+        self.rate_label.grid(row=0, column=7)
+
         tape_frame = ttk.LabelFrame(main_frame, text="Cinta", padding="5")
         tape_frame.grid(row=3, column=0, columnspan=2, sticky="nsew")
 
         self.tape_canvas = tk.Canvas(tape_frame, height=120, bg="white", relief=tk.SUNKEN, borderwidth=1)
         self.tape_canvas.pack(fill=tk.BOTH, expand=True)
-
-    def initialize_submachines(self):
-        incrementador = MaquinaTuring("", transiciones_incrementador, "s0", "s2", "Incrementador")
-        decrementador = MaquinaTuring("", transiciones_decrementador, "s0", "s2", "Decrementador")
-        copiar_en_resultado = MaquinaTuring("", transiciones_copiar_en_resultado, "s0", "s9", "CopiarEnResultado")
-        mover_resultado = MaquinaTuring("", transiciones_mover_resultado, "s0", "s6", "MoverResultado")
-        copiar_al_principio = MaquinaTuring("", transiciones_copiar_al_inicio, "s0", "s12", "CopiarAlInicio")
-        recargar_operador = MaquinaTuring("", transiciones_recargar_operador, "s0", "s16", "RecargarOperador")
-        sumador = MaquinaTuring("", transiciones_sumador, "s2", "s11", "Sumador")
-        restador = MaquinaTuring("", transiciones_restador, "s2", "s11", "Restador")
-        multiplicador = MaquinaTuring("", transiciones_multiplicador, "s0", "s30", "Multiplicador")
-        divisor = MaquinaTuring("", transiciones_divisor, "s0", "s40", "Divisor")
-        sumador_inicio = MaquinaTuring("", transiciones_sumador_inicio, "s0", "s11", "SumadorInicio")
-        restador_inicio = MaquinaTuring("", transiciones_restador_inicio, "s0", "s11", "RestadorInicio")
-
-        MaquinaTuring.submaquinas_globales = {
-            "I": incrementador, "D": decrementador, "CaR": copiar_en_resultado,
-            "S": sumador, "SI":sumador_inicio, "XI":restador_inicio, "MR": mover_resultado, "X": restador, 
-            "CaP": copiar_al_principio, "M": multiplicador, "RO": recargar_operador,
-            "Div": divisor
-        }
-
-        for m in MaquinaTuring.submaquinas_globales.values():
-            m.running_flag = lambda: self.running
+        self.tape_canvas.bind("<Configure>", lambda event: self.mark_dirty())
+
+        scroll_frame = ttk.Frame(tape_frame)
+        scroll_frame.pack(fill=tk.X)
+        self.tape_scroll = ttk.Scrollbar(scroll_frame, orient=tk.HORIZONTAL, command=self.on_scroll)
+        self.tape_scroll.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        self.follow_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(scroll_frame, text="Seguir cabezal", variable=self.follow_var,
+                        command=self.mark_dirty).pack(side=tk.LEFT, padx=5)
+
+        trace_frame = ttk.LabelFrame(main_frame, text="Traza", padding="5")
+        trace_frame.grid(row=4, column=0, columnspan=2, sticky="ew")
+        trace_frame.columnconfigure(4, weight=1)
+
+        ttk.Button(trace_frame, text="Grabar traza", command=self.record_trace).grid(row=0, column=0, padx=5)
+        ttk.Button(trace_frame, text="Abrir traza", command=self.open_trace).grid(row=0, column=1, padx=5)
+        ttk.Button(trace_frame, text="◀", width=3, command=lambda: self.trace_step(-1)).grid(row=0, column=2)
+        ttk.Button(trace_frame, text="▶", width=3, command=lambda: self.trace_step(1)).grid(row=0, column=3)
+        self.trace_var = tk.DoubleVar(value=0)
+        self.trace_scale = ttk.Scale(trace_frame, from_=0, to=0, variable=self.trace_var,
+                                     orient=tk.HORIZONTAL, command=self.on_trace_scale)
+        self.trace_scale.grid(row=0, column=4, sticky="ew", padx=5)
 
     def decimal_to_binary(self, s):
         try:
@@ -227,34 +208,139 @@ class TuringMachineGUI:
             return None
         return f"{b1} {b2} {operator} "
 
-    def on_paso_callback(self, maquina):
-        self.step_count += 1
-        self.maquina_actual = maquina
-        self.root.after(0, self.update_display)
+    def refresh_loop(self):
+        self.read_controls()
+        if self.dirty:
+            self.dirty = False
+            self.update_display()
+        elif self.running and self.maquina_actual:
+            # al saltar al final solo se actualiza la lectura, no la cinta
+            self.update_labels()
+        self.update_rate()
+        self.root.after(CUADRO_MS, self.refresh_loop)
+
+    def read_controls(self):
+        self.delay = self.speed_var.get()
+        self.mode = self.mode_var.get()
+        try:
+            self.turbo_steps = max(1, self.turbo_var.get())
+        except tk.TclError:
+            pass
 
-    def update_display(self):
-        if not self.maquina_actual:
+    def update_rate(self):
+        ahora = time.perf_counter()
+        if ahora - self.rate_time < VENTANA_VELOCIDAD:
             return
+        if self.running:
+            velocidad = (self.step_count - self.rate_steps) / (ahora - self.rate_time)
+            self.rate_label.config(text=f"{velocidad:,.0f}")
+        self.rate_time, self.rate_steps = ahora, self.step_count
+
+    def mark_dirty(self):
+        self.dirty = True
 
+    def clear_tape(self):
         self.tape_canvas.delete("all")
+        self.cell_items = []
+        self.drawn = []
+        self.view_start = 0
+        self.head_items = None
+
+    def visible_cells(self):
+        return max(1, (self.tape_canvas.winfo_width() - 20) // ANCHO_CELDA + 1)
+
+    def on_scroll(self, *args):
+        """Desplaza la ventana desde la barra; deja de seguir al cabezal."""
+        if not self.maquina_actual:
+            return
         tape = self.maquina_actual.cinta
-        head = self.maquina_actual.cabezal
+        visibles = self.visible_cells()
+        if args[0] == "moveto":
+            self.view_start = tape.inicio + round(float(args[1]) * len(tape))
+        else:
+            paso = visibles if args[2] == "pages" else 1
+            self.view_start += int(args[1]) * paso
+        self.view_start = max(tape.inicio - visibles // 2,
+                              min(self.view_start, tape.fin - visibles // 2))
+        self.follow_var.set(False)
+        self.update_display()
 
-        w = 40
+    def draw_tape(self, tape, cabezal):
+        """Dibuja la ventana visible de la cinta, cambiando solo las casillas distintas."""
+        w = ANCHO_CELDA
         y = 60
-        for i, s in enumerate(tape):
-            x = 20 + i * w
-            self.tape_canvas.create_rectangle(x, y - 20, x + w, y + 20, outline="black", fill="lightblue")
-            self.tape_canvas.create_text(x + w//2, y, text=s, font=("Arial", 12, "bold"))
-            if i == head:
-                self.tape_canvas.create_rectangle(x, y - 20, x + w, y + 20, outline="red", width=3)
-                self.tape_canvas.create_polygon(x+w//2-10, y-40, x+w//2+10, y-40, x+w//2, y-20,
-                                                fill="red")
+        visibles = self.visible_cells()
+        if len(self.cell_items) != visibles:
+            self.tape_canvas.delete("celda")
+            self.cell_items = []
+            for i in range(visibles):
+                x = 20 + i * w
+                rect = self.tape_canvas.create_rectangle(x, y - 20, x + w, y + 20, outline="black",
+                                                         fill="lightblue", tags="celda")
+                text = self.tape_canvas.create_text(x + w//2, y, text="", font=("Arial", 12, "bold"),
+                                                    tags="celda")
+                self.cell_items.append((rect, text))
+            self.drawn = [None] * visibles
+
+        if self.follow_var.get():
+            margen = min(2, visibles // 2)
+            if cabezal < self.view_start + margen:
+                self.view_start = cabezal - margen
+            elif cabezal >= self.view_start + visibles - margen:
+                self.view_start = cabezal - visibles + margen + 1
+
+        inicio = self.view_start
+        contenido = tape.leer(inicio, inicio + visibles)
+        for i, byte in enumerate(contenido):
+            # las casillas fuera de la parte usada de la cinta van en blanco
+            dibujo = (chr(byte), tape.inicio <= inicio + i < tape.fin)
+            if self.drawn[i] != dibujo:
+                rect, text = self.cell_items[i]
+                self.tape_canvas.itemconfig(text, text=dibujo[0])
+                self.tape_canvas.itemconfig(rect, fill="lightblue" if dibujo[1] else "white")
+                self.drawn[i] = dibujo
+
+        x = 20 + (cabezal - inicio) * w
+        marco = (x, y - 20, x + w, y + 20)
+        flecha = (x+w//2-10, y-40, x+w//2+10, y-40, x+w//2, y-20)
+        if self.head_items is None:
+            self.head_items = (
+                self.tape_canvas.create_rectangle(*marco, outline="red", width=3),
+                self.tape_canvas.create_polygon(*flecha, fill="red"))
+        else:
+            self.tape_canvas.coords(self.head_items[0], *marco)
+            self.tape_canvas.coords(self.head_items[1], *flecha)
+            self.tape_canvas.tag_raise(self.head_items[0])
+            self.tape_canvas.tag_raise(self.head_items[1])
+
+        largo = max(1, len(tape))
+        self.tape_scroll.set(max(0.0, (inicio - tape.inicio) / largo),
+                             min(1.0, (inicio + visibles - tape.inicio) / largo))
+
+    def update_display(self):
+        if not self.maquina_actual:
+            return
+
+        self.draw_tape(self.maquina_actual.cinta, self.maquina_actual.cabezal)
+        self.update_labels()
 
+    def update_labels(self):
         self.machine_label.config(text=self.maquina_actual.nombre)
         self.state_label.config(text=self.maquina_actual.estado)
         self.steps_label.config(text=str(self.step_count))
 
+    def new_execution(self, tape_str):
+        """Prepara una ejecución del motor sobre ``tape_str`` y la muestra."""
+        self.close_trace()
+        self.checkpoints = PuntosDeControl(INTERVALO_PUNTOS)
+        ejecucion = Ejecucion(motor_compartido().programa, tape_str, puntos=self.checkpoints,
+                              avisos=self.progress)
+        self.stepper = VistaEjecucion(ejecucion)
+        self.maquina_actual = self.stepper
+        self.step_count = 0
+        self.clear_tape()
+        return ejecucion
+
     def start_execution(self):
         if self.running:
             return
@@ -263,65 +349,215 @@ class TuringMachineGUI:
         if tape_str is None:
             return
 
-        self.step_count = 0
-        self.maquina_actual = MaquinaTuring(tape_str, transiciones_iniciador, "s0", "s21", "Iniciador")
-        self.maquina_actual.set_callback_paso(self.on_paso_callback)
-        self.maquina_actual.running_flag = lambda: self.running
-        self.maquina_actual.set_delay(self.speed_var.get())
-
+        ejecucion = self.new_execution(tape_str)
         self.update_display()
+        self.start_running(ejecucion)
+
+        threading.Thread(target=self.run_machine, args=(ejecucion, self.control), daemon=True).start()
 
+    def start_running(self, ejecucion):
+        self.control = Control()
+        ejecucion.controlar(self.control)
         self.running = True
+        self.skipping = False
+        self.rate_time, self.rate_steps = time.perf_counter(), self.step_count
         self.start_button.config(state=tk.DISABLED)
         self.step_button.config(state=tk.DISABLED)
+        self.back_button.config(state=tk.DISABLED)
         self.stop_button.config(state=tk.NORMAL)
 
-        threading.Thread(target=self.run_machine, daemon=True).start()
+    def run_machine(self, ejecucion, control):
+        # los pasos se dan en tandas según el modo; refresh_loop redibuja a su ritmo
+        try:
+            while not control.cancelado and not ejecucion.terminada:
+                if self.skipping:
+                    ejecucion.correr()
+                elif self.mode == "Turbo":
+                    ejecucion.avanzar(self.turbo_steps)
+                    time.sleep(CUADRO_MS / 1000)
+                else:
+                    ejecucion.avanzar(1)
+                    time.sleep(self.delay)
+                self.step_count = ejecucion.pasos
+                if not self.skipping:
+                    self.dirty = True
+        except EjecucionAbortada:
+            # Detener canceló la corrida: queda en el último paso dado
+            self.step_count = ejecucion.pasos
+        # el control cancelado no debe frenar los pasos manuales que sigan
+        ejecucion.controlar(None)
+        self.root.after(0, self.execution_finished)
+
+    def skip_to_end(self):
+        """Termina el cálculo sin demoras y muestra solo el estado final.
 
-    def run_machine(self):
-        while self.running and self.maquina_actual.estado != self.maquina_actual.estado_final:
-            self.maquina_actual.set_delay(self.speed_var.get())
-            if not self.maquina_actual.paso():
-                break
-            time.sleep(self.speed_var.get())
+        Si la máquina no está en marcha, el resto del cálculo se hace con
+        ``Ejecucion.correr``, con barridos y atajos; si ya está corriendo,
+        pasa a hacerlo también, sin pausas ni dibujos.
+        """
+        if self.running:
+            self.skipping = True
+            return
+        if self.reproductor is not None:
+            self.trace_step(len(self.reproductor.traza))
+            return
+        if self.stepper is not None:
+            ejecucion = self.stepper.ejecucion
+        else:
+            tape_str = self.create_tape_string(self.num1_entry.get(), self.num2_entry.get(), self.operator_entry.get())
+            if tape_str is None:
+                return
+            ejecucion = self.new_execution(tape_str)
+
+        self.start_running(ejecucion)
+        self.skipping = True
+        self.machine_label.config(text="Motor compilado")
+        threading.Thread(target=self.run_compiled, args=(ejecucion,), daemon=True).start()
+
+    def on_progress(self, ejecucion):
+        # corre en el hilo de la máquina
+        self.step_count = ejecucion.pasos
+
+    def run_compiled(self, ejecucion):
+        try:
+            ejecucion.correr()
+        except EjecucionAbortada:
+            pass
+        ejecucion.controlar(None)
+        self.step_count = ejecucion.pasos
         self.root.after(0, self.execution_finished)
 
     def step_execution(self):
-        if not self.maquina_actual:
+        if self.reproductor is not None:
+            self.trace_step(1)
+            return
+        if self.stepper is None:
             tape_str = self.create_tape_string(self.num1_entry.get(), self.num2_entry.get(), self.operator_entry.get())
             if tape_str is None:
                 return
-            self.maquina_actual = MaquinaTuring(tape_str, transiciones_iniciador, "s0", "s21", "Iniciador")
-            self.maquina_actual.set_callback_paso(self.on_paso_callback)
-            self.step_count = 0
+            self.new_execution(tape_str)
+
+        ejecucion = self.stepper.ejecucion
+        if ejecucion.avanzar(1):
+            self.step_count = ejecucion.pasos
+        self.dirty = True
+
+    def step_back(self):
+        """Retrocede un paso restaurando el punto de control anterior y avanzando hasta él."""
+        if self.running:
+            return
+        if self.reproductor is not None:
+            self.trace_step(-1)
+            return
+        if not self.step_count or self.stepper is None:
+            return
 
-        if self.maquina_actual.estado != self.maquina_actual.estado_final:
-            self.maquina_actual.paso()
+        ejecucion = self.checkpoints.reconstruir(motor_compartido().programa, self.step_count - 1,
+                                                 self.progress)
+        self.stepper = VistaEjecucion(ejecucion)
+        self.maquina_actual = self.stepper
+        self.step_count = ejecucion.pasos
+        self.dirty = True
+
+    def record_trace(self):
+        """Graba la traza del cálculo de los parámetros actuales y la abre."""
+        if self.running:
+            return
+        tape_str = self.create_tape_string(self.num1_entry.get(), self.num2_entry.get(), self.operator_entry.get())
+        if tape_str is None:
+            return
+        ruta = filedialog.asksaveasfilename(defaultextension=".trz", filetypes=[("Trazas", "*.trz")])
+        if not ruta:
+            return
+
+        def trabajo():
+            grabar(motor_compartido().programa, tape_str, ruta, comprimir=True)
+            self.root.after(0, lambda: self.load_trace(ruta))
+
+        self.machine_label.config(text="Grabando traza...")
+        threading.Thread(target=trabajo, daemon=True).start()
+
+    def open_trace(self):
+        if self.running:
+            return
+        ruta = filedialog.askopenfilename(filetypes=[("Trazas", "*.trz"), ("Todos", "*")])
+        if ruta:
+            self.load_trace(ruta)
+
+    def load_trace(self, ruta):
+        try:
+            traza = Traza(ruta)
+        except (OSError, ValueError) as e:
+            messagebox.showerror("Error", f"No se pudo abrir la traza: {e}")
+            return
+        self.close_trace()
+        self.reproductor = Reproductor(traza)
+        self.maquina_actual = self.reproductor
+        self.step_count = 0
+        self.trace_scale.config(to=len(traza))
+        self.trace_var.set(0)
+        self.clear_tape()
+        self.dirty = True
+
+    def close_trace(self):
+        if self.reproductor is not None:
+            self.reproductor.traza.cerrar()
+            self.reproductor = None
+            self.trace_scale.config(to=0)
+            self.trace_var.set(0)
+
+    def on_trace_scale(self, valor):
+        if self.reproductor is None:
+            return
+        self.reproductor.ir(int(float(valor)))
+        self.step_count = self.reproductor.paso
+        self.dirty = True
+
+    def trace_step(self, pasos):
+        if self.reproductor is None:
+            return
+        paso = max(0, min(self.reproductor.paso + pasos, len(self.reproductor.traza)))
+        self.trace_var.set(paso)
+        self.on_trace_scale(self.trace_var.get())
 
     def stop_execution(self):
-        self.running = False
-        self.start_button.config(state=tk.NORMAL)
-        self.step_button.config(state=tk.NORMAL)
+        # la corrida se cancela en su próximo control; el hilo avisa con
+        # execution_finished, que vuelve a habilitar los botones
+        if self.control is not None:
+            self.control.cancelar()
         self.stop_button.config(state=tk.DISABLED)
 
     def execution_finished(self):
         self.running = False
+        self.skipping = False
+        self.dirty = True
+        self.rate_label.config(text="---")
         self.start_button.config(state=tk.NORMAL)
         self.step_button.config(state=tk.NORMAL)
+        self.back_button.config(state=tk.NORMAL)
         self.stop_button.config(state=tk.DISABLED)
 
     def reset_machine(self):
         self.running = False
+        if self.control is not None:
+            self.control.cancelar()
+        self.skipping = False
+        self.close_trace()
+        self.stepper = None
+        self.checkpoints = None
         self.maquina_actual = None
         self.step_count = 0
+        self.dirty = False
 
-        self.tape_canvas.delete("all")
+        self.clear_tape()
         self.machine_label.config(text="Ninguna")
         self.state_label.config(text="---")
         self.steps_label.config(text="0")
+        self.rate_label.config(text="---")
 
         self.start_button.config(state=tk.NORMAL)
         self.step_button.config(state=tk.NORMAL)
+        self.back_button.config(state=tk.NORMAL)
         self.stop_button.config(state=tk.DISABLED)
 
 
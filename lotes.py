@@ -0,0 +1,165 @@
+"""Evaluación de muchos cálculos en paralelo con un pool de procesos.
+
+Cada línea de entrada tiene la forma ``num1 num2 operador`` (en decimal).
+Las expresiones se agrupan en bloques para amortizar la comunicación entre
+procesos, y cada proceso compila el programa una sola vez al iniciar.
+Los resultados salen en el mismo orden que la entrada, a medida que se
+completan, con a lo sumo ``2 * procesos`` bloques en vuelo.
+"""
+
+import argparse
+import itertools
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from calculadora import (CacheCalculos, Calculo, calcular, calculo_invalido, crear_cinta,
+                         motor_compartido)
+from motor import Limites
+
+
+def leer_expresiones(lineas):
+    """Genera ``(num1, num2, operador)`` a partir de líneas de texto.
+
+    Las líneas vacías y las que empiezan con ``#`` se ignoran. Por cada
+    línea inválida se genera en su lugar un ``Calculo`` con el error
+    (ver ``calculadora.calculo_invalido``), así el resto del lote sigue.
+    """
+    for numero, linea in enumerate(lineas, 1):
+        linea = linea.strip()
+        if not linea or linea.startswith("#"):
+            continue
+        partes = linea.split()
+        if len(partes) != 3:
+            yield calculo_invalido(None, None, None,
+                                   f"línea {numero}: se esperaba 'num1 num2 operador': {linea!r}")
+            continue
+        try:
+            crear_cinta(*partes)
+        except ValueError as e:
+            yield calculo_invalido(*partes, f"línea {numero}: {e}: {linea!r}")
+            continue
+        yield partes[0], partes[1], partes[2]
+
+
+_cache = None
+_limites = None
+
+
+def _iniciar_proceso(capacidad_cache, limites=None):
+    global _cache, _limites
+    motor_compartido()
+    if capacidad_cache:
+        _cache = CacheCalculos(capacidad_cache)
+    _limites = limites
+
+
+def _evaluar(expresion):
+    if isinstance(expresion, Calculo):
+        return expresion
+    try:
+        return calcular(*expresion, cache=_cache, limites=_limites)
+    except ValueError as e:
+        return calculo_invalido(*expresion, str(e))
+
+
+def _evaluar_bloque(bloque):
+    return [_evaluar(expresion) for expresion in bloque]
+
+
+def _en_bloques(expresiones, tam_bloque):
+    expresiones = iter(expresiones)
+    while True:
+        bloque = list(itertools.islice(expresiones, tam_bloque))
+        if not bloque:
+            return
+        yield bloque
+
+
+def evaluar_lote(expresiones, procesos=None, tam_bloque=64, capacidad_cache=0, limites=None):
+    """Evalúa ``(num1, num2, operador)`` en paralelo y genera los ``Calculo`` en orden.
+
+    Con ``capacidad_cache`` cada proceso mantiene su propia ``CacheCalculos``
+    en memoria de ese tamaño. Con ``limites`` (unos ``motor.Limites``) un
+    cálculo que los supera sale con ``error`` en lugar de trabar al proceso.
+    Una expresión inválida sale con ``error`` sin cortar el lote, y los
+    ``Calculo`` que vengan entre las expresiones salen tal cual.
+    """
+    procesos = procesos or os.cpu_count() or 1
+    bloques = _en_bloques(expresiones, tam_bloque)
+
+    with ProcessPoolExecutor(procesos, initializer=_iniciar_proceso,
+                             initargs=(capacidad_cache, limites)) as pool:
+        pendientes = deque(pool.submit(_evaluar_bloque, bloque)
+                           for bloque in itertools.islice(bloques, 2 * procesos))
+        while pendientes:
+            calculos = pendientes.popleft().result()
+            for bloque in itertools.islice(bloques, 1):
+                pendientes.append(pool.submit(_evaluar_bloque, bloque))
+            yield from calculos
+
+
+def formatear(calculo):
+    """Línea de salida: ``num1 num2 operador valor pasos`` (``-`` si no hay valor).
+
+    Si el cálculo se abortó, se agrega el motivo; si la expresión era
+    inválida, la línea es ``error: mensaje``.
+    """
+    if calculo.error is not None and calculo.error["motivo"] == "invalido":
+        return f"error: {calculo.error['mensaje']}"
+    valor = "-" if calculo.valor is None else calculo.valor
+    linea = f"{calculo.num1} {calculo.num2} {calculo.operador} {valor} {calculo.pasos}"
+    if calculo.error is not None:
+        linea += f" abortado:{calculo.error['motivo']}"
+    return linea
+
+
+# límites por defecto de cada cálculo en los lotes y el servidor: de sobra para
+# cualquier cálculo razonable, pero ningún proceso queda trabado para siempre
+MAX_PASOS = 100_000_000
+MAX_SEGUNDOS = 30.0
+
+
+def agregar_limites(parser):
+    """Agrega al ``parser`` las opciones de límites por cálculo.
+
+    Por defecto los cálculos tienen límites y se cortan los ciclos; hay que
+    pedir explícitamente correr sin ellos.
+    """
+    parser.add_argument("--max-pasos", type=int, default=MAX_PASOS,
+                        help=f"aborta los cálculos que superen esta cantidad de pasos "
+                             f"(por defecto {MAX_PASOS}; 0 sin límite)")
+    parser.add_argument("--max-segundos", type=float, default=MAX_SEGUNDOS,
+                        help=f"aborta los cálculos que tarden más que estos segundos "
+                             f"(por defecto {MAX_SEGUNDOS:g}; 0 sin límite)")
+    parser.add_argument("--sin-ciclos", action="store_true",
+                        help="no aborta los cálculos cuya configuración se repite")
+
+
+def leer_limites(args):
+    """``Limites`` armados con las opciones de ``agregar_limites``, o None si no hay ninguno."""
+    pasos = args.max_pasos or None
+    segundos = args.max_segundos or None
+    if pasos is None and segundos is None and args.sin_ciclos:
+        return None
+    return Limites(pasos, segundos, not args.sin_ciclos)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evalúa cálculos en lote con un pool de procesos")
+    parser.add_argument("archivo", nargs="?", type=argparse.FileType("r"), default=sys.stdin,
+                        help="archivo con una expresión 'num1 num2 operador' por línea (por defecto stdin)")
+    parser.add_argument("-p", "--procesos", type=int, default=None,
+                        help="cantidad de procesos (por defecto, uno por núcleo)")
+    parser.add_argument("-b", "--bloque", type=int, default=64,
+                        help="expresiones por bloque enviado a cada proceso")
+    parser.add_argument("-c", "--cache", type=int, default=0,
+                        help="resultados guardados en la cache LRU de cada proceso (0 la desactiva)")
+    agregar_limites(parser)
+    args = parser.parse_args()
+
+    calculos = evaluar_lote(leer_expresiones(args.archivo), args.procesos, args.bloque, args.cache,
+                            leer_limites(args))
+    for calculo in calculos:
+        print(formatear(calculo))
@@ -1,142 +1,92 @@
 
+import argparse
+import sys
 import time
 
-from transiciones import (
-        transiciones_incrementador,
-        transiciones_decrementador,
-        transiciones_sumador,
-        transiciones_copiar_en_resultado,
-        transiciones_iniciador,
-        transiciones_mover_resultado,
-        transiciones_restador,
-        transiciones_copiar_al_inicio,
-        transiciones_multiplicador,
-        transiciones_recargar_operador,
+from calculadora import OPERADORES, crear_cinta, leer_resultado, motor_compartido
+from motor import Avisos, Ejecucion, MemoriaSubmaquinas, Motor, Observador
+from perfil import Perfil
 
-        transiciones_divisor,
-        transiciones_sumador_inicio,
-        transiciones_restador_inicio
-        )
 
-class MaquinaTuring:
-    submaquinas_globales = {}
+class Impresor(Observador):
+    """Imprime la cinta antes de cada paso y avisa las llamadas a submáquinas."""
 
-    def __init__(self, cinta, transiciones, estado_inicial, estado_final, submaquinas=None):
-        self.cinta = list(cinta)
-        self.transiciones = transiciones
-        self.estado_inicial = estado_inicial
-        self.estado = estado_inicial
-        self.estado_final = estado_final
-        self.cabezal = 0
-        self.submaquinas = submaquinas or {}
+    def __init__(self, delay=0.01):
+        self.delay = delay
 
-    def paso(self):
-        """Ejecuta un paso de la máquina."""
-        simbolo = self.cinta[self.cabezal]
-        clave = (self.estado, simbolo)
+    def entrar(self, ejecucion, nombre):
+        if ejecucion.pasos:
+            print(f"🔁 Ejecutando submáquina {nombre} (compartiendo cinta)...\n")
 
-        if clave not in self.transiciones:
-            print(f"⚠️  No hay transición definida para {clave}")
-            return False
+    def salir(self, ejecucion, nombre):
+        if ejecucion.pila:
+            self.mostrar(ejecucion)
+            print("↩️  Submáquina finalizada. Cambios preservados.\n")
 
-        nuevo_estado, escribir, mover = self.transiciones[clave]
+    def transicion(self, ejecucion, estado, simbolo):
+        self.mostrar(ejecucion)
+        if self.delay:
+            time.sleep(self.delay)
 
-        # Escribir en la cinta
-        if escribir != 'n':
-            self.cinta[self.cabezal] = escribir
+    def terminar(self, ejecucion):
+        self.mostrar(ejecucion)
+        print("✅ Máquina detenida en estado final:", ejecucion.resultado().estado)
 
-        # Actualizar estado
-        self.estado = nuevo_estado
-
-        # Movimiento especial
-        if mover == "R":
-            self.cabezal += 1
-        elif mover == "L":
-            self.cabezal -= 1
-        elif mover == "N":
-            pass
-        else:
-            self.llamar_submaquina(mover)
-            return True  # detener ejecución principal
-
-        # proteger límites
-        if self.cabezal >= len(self.cinta):
-            self.cinta.append(' ')
-        elif self.cabezal < 0:
-            self.cinta.insert(0, ' ')
-            self.cabezal = 0
-
-        return True
-
-
-    def llamar_submaquina(self, mover):
-        print("🔁 Ejecutando submáquina (compartiendo cinta)...\n")
-
-        if mover in self.submaquinas:
-            submaquina = self.submaquinas[mover]
-        else:
-            submaquina = MaquinaTuring.submaquinas_globales.get(mover,None)
-
-        if submaquina is None:
-            print(f"no se encontro la maquina, mover: {mover}")
-            return
-
-
-        submaquina.cinta = self.cinta
-        submaquina.cabezal = self.cabezal
-        submaquina.estado = submaquina.estado_inicial
-
-        submaquina.ejecutar()
-
-        self.cinta = submaquina.cinta
-        self.cabezal = submaquina.cabezal
-
-        print("↩️  Submáquina finalizada. Cambios preservados.\n")
-
-    def ejecutar(self, delay=0.01):
-        """Ejecuta toda la máquina paso a paso."""
-        while self.estado != self.estado_final:
-            self.mostrar()
-            if not self.paso():
-                break
-            time.sleep(delay)
-        self.mostrar()
-        print("✅ Máquina detenida en estado final:", self.estado)
-
-    def mostrar(self):
+    def mostrar(self, ejecucion):
         """Imprime la cinta y la posición del cabezal."""
-        cinta_str = "".join(self.cinta)
-        indicador = " " * self.cabezal + "^"
-        print(f"{cinta_str}\n{indicador}  Estado: {self.estado}\n")
+        cinta = ejecucion.cinta
+        indicador = " " * cinta.indice(ejecucion.cabezal) + "^"
+        estado = ejecucion.programa.nombres_estado[ejecucion.estado][1]
+        print(f"{cinta}\n{indicador}  Estado: {estado}\n")
 
-if __name__ == "__main__":
-    incrementador = MaquinaTuring("", transiciones_incrementador,"s0","s2")
-    decrementador = MaquinaTuring("", transiciones_decrementador,"s0","s2")
-    copiar_en_resultado = MaquinaTuring("", transiciones_copiar_en_resultado, "s0","s9")
-    mover_resultado = MaquinaTuring("",transiciones_mover_resultado, "s0","s6")
-    copiar_al_principio = MaquinaTuring("", transiciones_copiar_al_inicio, "s0", "s12")
-    recargar_operador = MaquinaTuring("", transiciones_recargar_operador, "s0","s16")
-    sumador = MaquinaTuring("", transiciones_sumador,"s2","s11")
-    restador = MaquinaTuring("", transiciones_restador,"s2","s11")
-    multiplicador = MaquinaTuring("",transiciones_multiplicador, "s0", "s30")
-    divisor = MaquinaTuring("", transiciones_divisor, "s0","s40")
-    sumador_inicio = MaquinaTuring("", transiciones_sumador_inicio, "s0", "s11", "SumadorInicio")
-    restador_inicio = MaquinaTuring("", transiciones_restador_inicio, "s0", "s11", "RestadorInicio")
-
-    MaquinaTuring.submaquinas_globales = {"I": incrementador,
-                                          "D": decrementador,
-                                          "CaR": copiar_en_resultado,
-                                          "S":sumador, "MR":mover_resultado,
-                                          "X":restador,"CaP": copiar_al_principio,
-                                          "M": multiplicador,
-                                          "RO": recargar_operador,
-                                          "Div": divisor,
-                                          "SI":sumador_inicio, "XI":restador_inicio}
-
-    iniciador = MaquinaTuring(
-            " 100 11 - ",
-            transiciones_iniciador,
-            "s0","s21")
-
-    iniciador.ejecutar()
 
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Calculadora con máquina de Turing")
+    parser.add_argument("num1", nargs="?", default="4")
+    parser.add_argument("num2", nargs="?", default="3")
+    parser.add_argument("operador", nargs="?", default="-", choices=OPERADORES)
+    parser.add_argument("--rapido", action="store_true",
+                        help="ejecuta con el motor compilado, sin demoras ni impresión")
+    parser.add_argument("--delay", type=float, default=0.01)
+    parser.add_argument("--memoria", type=int, default=0,
+                        help="con --rapido, entradas de la cache de submáquinas hoja (0 la desactiva)")
+    parser.add_argument("--validar", type=int, default=0, metavar="N",
+                        help="con --rapido, compara con la tabla una de cada N llamadas a I/D")
+    parser.add_argument("--progreso", type=float, default=None, metavar="SEGUNDOS",
+                        help="con --rapido, informa por stderr el paso y la máquina en curso "
+                             "cada tantos segundos")
+    parser.add_argument("--perfil", metavar="PREFIJO", default=None,
+                        help="ejecuta paso a paso sin demoras y guarda el perfil en PREFIJO.json "
+                             "y PREFIJO.folded (pilas colapsadas para flamegraph)")
+    args = parser.parse_args()
+
+    cinta = crear_cinta(args.num1, args.num2, args.operador)
+
+    if args.rapido:
+        memoria = MemoriaSubmaquinas(args.memoria) if args.memoria else None
+        avisos = None
+        if args.progreso:
+            avisos = Avisos().cada_segundos(args.progreso, lambda ejecucion: print(
+                f"paso {ejecucion.pasos}: " + " > ".join(ejecucion.llamadas_en_curso()),
+                file=sys.stderr))
+        resultado = Motor(memoria=memoria, validar=args.validar).ejecutar(cinta, avisos=avisos)
+        print(f"Cinta final: {resultado.cinta!r}")
+        print(f"Pasos: {resultado.pasos}")
+        print(f"Estado final: {resultado.estado}")
+        print(f"Resultado: {leer_resultado(resultado.cinta)}")
+        if memoria is not None:
+            print(f"Memoria: {memoria.estadisticas()}")
+    elif args.perfil:
+        perfil = Perfil()
+        ejecucion = Ejecucion(motor_compartido().programa, cinta, observador=perfil)
+        ejecucion.correr()
+        resultado = ejecucion.resultado()
+        perfil.guardar_json(args.perfil + ".json")
+        perfil.guardar_colapsado(args.perfil + ".folded")
+        print(f"Pasos: {resultado.pasos}")
+        print(f"Resultado: {leer_resultado(resultado.cinta)}")
+        for nombre, datos in perfil.maquinas().items():
+            print(f"{nombre:>18}  pasos {datos['pasos']:>9}  llamadas {datos['llamadas']:>7}"
+                  f"  inclusivo {datos['inclusivo']:.4f} s  exclusivo {datos['exclusivo']:.4f} s")
+    else:
+        Ejecucion(motor_compartido().programa, cinta, observador=Impresor(args.delay)).correr()
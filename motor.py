@@ -0,0 +1,879 @@
+"""Motor que ejecuta las máquinas compiladas sin demoras ni impresión."""
+
+import bisect
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from cinta import Cinta
+from compilador import ANCHO, BARRIDO, CODIGOS, LLAMADA, R, L, compilar, enlazar
+
+Resultado = namedtuple("Resultado", ["cinta", "pasos", "estado"])
+
+# ``pasos``: máximo de pasos; ``segundos``: tiempo máximo de reloj;
+# ``ciclos``: abortar si la configuración completa se repite
+Limites = namedtuple("Limites", ["pasos", "segundos", "ciclos"], defaults=(None, None, False))
+
+# cada cuántos pasos se mira el reloj y se busca un ciclo
+INTERVALO_CONTROL = 1 << 16
+
+# cada cuántos pasos se mira el reloj si hay avisos por tiempo
+INTERVALO_RELOJ = 1 << 12
+
+# cada cuántos pasos se consulta el ``Control`` de la ejecución, si tiene
+INTERVALO_PAUSA = 1 << 12
+
+
+class EjecucionAbortada(RuntimeError):
+    """La ejecución superó un límite o entró en un ciclo.
+
+    ``motivo`` es ``"pasos"``, ``"segundos"``, ``"ciclo"`` o ``"cancelada"``
+    (por un ``Control``); ``maquina`` y
+    ``estado`` son los nombres de la submáquina y el estado en curso,
+    ``llamadas`` la pila de máquinas desde la principal, y ``pasos`` y
+    ``cabezal`` los del momento en que se abortó.
+    """
+
+    def __init__(self, motivo, maquina, estado, llamadas, pasos, cabezal):
+        self.motivo = motivo
+        self.maquina = maquina
+        self.estado = estado
+        self.llamadas = llamadas
+        self.pasos = pasos
+        self.cabezal = cabezal
+        explicacion = {"pasos": "se superó el límite de pasos",
+                       "segundos": "se superó el límite de tiempo",
+                       "ciclo": "la configuración se repite",
+                       "cancelada": "se canceló la ejecución"}[motivo]
+        super().__init__(f"{explicacion}: {' > '.join(llamadas)} en el estado {estado} "
+                         f"(paso {pasos}, cabezal {cabezal})")
+
+    def a_dict(self):
+        return {"motivo": self.motivo, "maquina": self.maquina, "estado": self.estado,
+                "llamadas": list(self.llamadas), "pasos": self.pasos, "cabezal": self.cabezal}
+
+
+class Observador:
+    """Base para observar una ``Ejecucion`` paso a paso; los métodos no hacen nada.
+
+    ``entrar`` se llama al empezar la corrida con la máquina principal y en
+    cada llamada a una submáquina, y ``salir`` al terminar cada una;
+    ``transicion`` antes de aplicar cada transición, con los nombres del
+    estado local y del símbolo leído, y ``terminar`` cuando la máquina
+    principal se detiene. Los métodos reciben la ``Ejecucion``, cuyos
+    ``cinta``, ``cabezal`` y ``pasos`` están al día en cada llamada.
+    """
+
+    def entrar(self, ejecucion, nombre):
+        pass
+
+    def salir(self, ejecucion, nombre):
+        pass
+
+    def transicion(self, ejecucion, estado, simbolo):
+        pass
+
+    def terminar(self, ejecucion):
+        pass
+
+
+class Control:
+    """Pausa y cancelación cooperativas de ejecuciones desde otro hilo.
+
+    La ejecución lo consulta cada ``INTERVALO_PAUSA`` pasos: en pausa se
+    queda bloqueada ahí hasta ``reanudar`` o ``cancelar``, y cancelada
+    levanta ``EjecucionAbortada`` con motivo ``"cancelada"``, dejando su
+    estado al día. Un mismo ``Control`` puede compartirse entre varias
+    ejecuciones para detenerlas juntas; la cancelación no se deshace.
+    """
+
+    def __init__(self):
+        self.cancelado = False
+        self._sin_pausa = threading.Event()
+        self._sin_pausa.set()
+
+    @property
+    def pausado(self):
+        return not self._sin_pausa.is_set()
+
+    def pausar(self):
+        if not self.cancelado:
+            self._sin_pausa.clear()
+
+    def reanudar(self):
+        self._sin_pausa.set()
+
+    def cancelar(self):
+        self.cancelado = True
+        self._sin_pausa.set()
+
+    def esperar(self):
+        """Bloquea mientras esté en pausa; devuelve True si está cancelado."""
+        self._sin_pausa.wait()
+        return self.cancelado
+
+
+class Corrida:
+    """Una ``Ejecucion`` que corre en un hilo propio, manejada con un ``Control``.
+
+    ``pausar``, ``reanudar`` y ``cancelar`` hacen efecto la próxima vez que
+    la ejecución consulta el control.
+    """
+
+    def __init__(self, ejecucion, control=None):
+        self.ejecucion = ejecucion
+        self.control = control or Control()
+        self.error = None
+        ejecucion.controlar(self.control)
+        self._hilo = threading.Thread(target=self._correr, daemon=True)
+        self._hilo.start()
+
+    def _correr(self):
+        try:
+            self.ejecucion.correr()
+        except Exception as e:
+            self.error = e
+
+    @property
+    def terminada(self):
+        return not self._hilo.is_alive()
+
+    def pausar(self):
+        self.control.pausar()
+
+    def reanudar(self):
+        self.control.reanudar()
+
+    def cancelar(self):
+        self.control.cancelar()
+
+    def esperar(self, segundos=None):
+        """Espera a que la corrida termine y devuelve su ``Resultado``.
+
+        Si pasan ``segundos`` antes, devuelve None. Si la corrida se abortó,
+        también al cancelarla, levanta la excepción que la detuvo.
+        """
+        self._hilo.join(segundos)
+        if self._hilo.is_alive():
+            return None
+        if self.error is not None:
+            raise self.error
+        return self.ejecucion.resultado()
+
+
+class Avisos:
+    """Suscripciones a eventos de una ``Ejecucion`` sin una llamada por paso.
+
+    ``cada_pasos`` y ``cada_segundos`` reciben una función ``f(ejecucion)``
+    que se llama aproximadamente cada tantos pasos o segundos (los barridos
+    y los atajos dan muchos pasos de una vez, y el reloj se mira cada
+    ``INTERVALO_RELOJ`` pasos); ``al_entrar`` y ``al_salir``, una función
+    ``f(ejecucion, nombre)`` que se llama en cada llamada a una submáquina
+    y al volver de ella, y ``al_terminar``, una ``f(ejecucion)`` que se
+    llama cuando la máquina principal se detiene.
+
+    La ejecución solo lleva la cuenta de lo que tiene suscriptores: sin
+    avisos por pasos ni por tiempo no mira el reloj, y sin avisos de
+    llamadas no hace nada al entrar o salir de una submáquina. Los métodos
+    devuelven el mismo ``Avisos`` para poder encadenarlos.
+    """
+
+    def __init__(self):
+        self.por_pasos = []
+        self.por_tiempo = []
+        self.entradas = []
+        self.salidas = []
+        self.finales = []
+
+    def cada_pasos(self, pasos, funcion):
+        if pasos < 1:
+            raise ValueError("el intervalo de pasos debe ser al menos 1")
+        self.por_pasos.append((pasos, funcion))
+        return self
+
+    def cada_segundos(self, segundos, funcion):
+        self.por_tiempo.append((segundos, funcion))
+        return self
+
+    def al_entrar(self, funcion):
+        self.entradas.append(funcion)
+        return self
+
+    def al_salir(self, funcion):
+        self.salidas.append(funcion)
+        return self
+
+    def al_terminar(self, funcion):
+        self.finales.append(funcion)
+        return self
+
+
+class Motor:
+    """Ejecuta cálculos sobre un ``Programa`` compartido.
+
+    El motor no guarda estado de ninguna corrida, así que un mismo motor
+    puede usarse desde varios hilos a la vez.
+    """
+
+    def __init__(self, principal=None, barridos=True, memoria=None, atajos=True, validar=0,
+                 limites=None):
+        # None si el programa es la calculadora compilada (con o sin barridos da
+        # los mismos resultados); las caches de resultados la usan de clave
+        self.principal = principal
+        self.programa = enlazar(principal or compilar(barridos=barridos))
+        self.memoria = memoria
+        self.atajos = atajos
+        self.validar = validar
+        self.limites = limites
+
+    def preparar(self, cinta, cabezal=0, limites=None, avisos=None, control=None):
+        """``Ejecucion`` con la configuración del motor; ``limites`` reemplaza a los del motor."""
+        return Ejecucion(self.programa, cinta, cabezal, self.memoria, self.atajos, self.validar,
+                         limites=self.limites if limites is None else limites,
+                         avisos=avisos, control=control)
+
+    def ejecutar(self, cinta, cabezal=0, avisos=None):
+        """Ejecuta la máquina principal sobre la cinta dada."""
+        ejecucion = self.preparar(cinta, cabezal, avisos=avisos)
+        ejecucion.correr()
+        return ejecucion.resultado()
+
+    def lanzar(self, cinta, cabezal=0, avisos=None, control=None):
+        """Empieza a ejecutar en otro hilo y devuelve la ``Corrida``."""
+        return Corrida(self.preparar(cinta, cabezal, avisos=avisos), control)
+
+
+class MemoriaSubmaquinas:
+    """Cache de llamadas a submáquinas hoja (las que no llaman a otras).
+
+    Una llamada que, empezando con el cabezal en ``p``, solo visitó las
+    posiciones ``p + desde`` a ``p + hasta`` depende únicamente de esas
+    celdas: si vuelven a aparecer los mismos bytes alrededor del cabezal, el
+    resultado (celdas escritas, desplazamiento del cabezal y pasos) se
+    repite sin simular. Por cada máquina se recuerdan las últimas
+    ``formas`` ventanas ``(desde, hasta)`` vistas y se prueban en orden.
+    Guarda a lo sumo ``capacidad`` entradas y descarta la usada hace más
+    tiempo. Puede compartirse entre ejecuciones e hilos.
+    """
+
+    def __init__(self, capacidad=4096, formas=4, muestra=256, tasa_minima=0.5):
+        self.capacidad = capacidad
+        self.max_formas = formas
+        self.muestra = muestra
+        self.tasa_minima = tasa_minima
+        self.aciertos = 0
+        self.fallos = 0
+        self.desalojos = 0
+        # máquinas descartadas por tener pocos aciertos en la muestra
+        self.descartadas = set()
+        self._consultas = {}
+        self._entradas = OrderedDict()
+        self._formas = {}
+        self._lock = threading.Lock()
+
+    def buscar(self, maquina, cinta, cabezal):
+        """Devuelve ``(desde, salida, desplazamiento, pasos)`` o None."""
+        with self._lock:
+            consultas, aciertos = self._consultas.get(maquina, (0, 0))
+            formas = self._formas.get(maquina, ())
+            for i, (desde, hasta) in enumerate(formas):
+                clave = (maquina, desde, hasta, cinta.leer(cabezal + desde, cabezal + hasta + 1))
+                entrada = self._entradas.get(clave)
+                if entrada is not None:
+                    self._entradas.move_to_end(clave)
+                    if i:
+                        formas.insert(0, formas.pop(i))
+                    self.aciertos += 1
+                    self._contar(maquina, consultas + 1, aciertos + 1)
+                    return (desde,) + entrada
+            self.fallos += 1
+            self._contar(maquina, consultas + 1, aciertos)
+            return None
+
+    def _contar(self, maquina, consultas, aciertos):
+        # una máquina que casi nunca repite ventanas no compensa el costo
+        # de buscarla: pasada la muestra se deja de memorizar
+        if consultas >= self.muestra and aciertos < self.tasa_minima * consultas:
+            self.descartadas.add(maquina)
+        self._consultas[maquina] = (consultas, aciertos)
+
+    def guardar(self, maquina, desde, hasta, antes, salida, desplazamiento, pasos):
+        with self._lock:
+            formas = self._formas.setdefault(maquina, [])
+            if (desde, hasta) in formas:
+                formas.remove((desde, hasta))
+            formas.insert(0, (desde, hasta))
+            del formas[self.max_formas:]
+
+            self._entradas[(maquina, desde, hasta, antes)] = (salida, desplazamiento, pasos)
+            if len(self._entradas) > self.capacidad:
+                self._entradas.popitem(last=False)
+                self.desalojos += 1
+
+    def estadisticas(self):
+        with self._lock:
+            return {"aciertos": self.aciertos, "fallos": self.fallos,
+                    "desalojos": self.desalojos, "entradas": len(self._entradas),
+                    "capacidad": self.capacidad, "descartadas": sorted(self.descartadas)}
+
+
+Punto = namedtuple("Punto", ["pasos", "estado", "cabezal", "pila", "cinta",
+                             "pasos_maquina", "llamadas", "marca", "terminada"])
+
+# umbral de pasos que nunca se alcanza: sin eventos pendientes
+_NUNCA = 1 << 62
+
+
+class PuntosDeControl:
+    """Índice de instantáneas de una ejecución tomadas cada ``intervalo`` pasos.
+
+    Cada ``Punto`` guarda todo lo necesario para retomar la corrida: pila
+    de estados de retorno, estado, cabezal, cinta y contadores. Como la
+    ejecución es determinista, los puntos siguen valiendo aunque se vuelva
+    atrás, y ``reconstruir`` lleva cualquier paso restaurando el punto
+    anterior más cercano y avanzando de a un paso desde ahí.
+
+    Los barridos y los atajos dan muchos pasos de una vez, así que un
+    punto puede quedar unos pasos después del múltiplo de ``intervalo``.
+    """
+
+    def __init__(self, intervalo=10000):
+        if intervalo < 1:
+            raise ValueError("el intervalo debe ser al menos 1")
+        self.intervalo = intervalo
+        self.puntos = []
+        self._pasos = []
+
+    def __len__(self):
+        return len(self.puntos)
+
+    def tomar(self, ejecucion):
+        """Guarda un punto del estado actual de ``ejecucion``, si es posterior al último."""
+        if self._pasos and ejecucion.pasos <= self._pasos[-1]:
+            return
+        self._pasos.append(ejecucion.pasos)
+        self.puntos.append(Punto(ejecucion.pasos, ejecucion.estado, ejecucion.cabezal,
+                                 tuple(ejecucion.pila), ejecucion.cinta.instantanea(),
+                                 tuple(ejecucion.pasos_maquina), tuple(ejecucion.llamadas),
+                                 ejecucion._marca, ejecucion.terminada))
+
+    def proximo(self, pasos):
+        """Paso en el que corresponde tomar el siguiente punto."""
+        return (pasos // self.intervalo + 1) * self.intervalo
+
+    def anterior(self, paso):
+        """El último punto tomado en ``paso`` o antes."""
+        i = bisect.bisect_right(self._pasos, paso)
+        if not i:
+            raise ValueError(f"no hay puntos de control hasta el paso {paso}")
+        return self.puntos[i - 1]
+
+    def reconstruir(self, programa, paso, avisos=None):
+        """Nueva ``Ejecucion`` detenida exactamente después de ``paso`` pasos.
+
+        Si la corrida termina antes, queda en su estado final.
+        """
+        ejecucion = Ejecucion(programa, "", puntos=self, avisos=avisos)
+        ejecucion.restaurar(self.anterior(paso))
+        ejecucion.avanzar(paso - ejecucion.pasos)
+        return ejecucion
+
+
+class Ejecucion:
+    """Estado de una corrida: cinta, cabezal, estado, pila de retorno y pasos.
+
+    Los pasos propios de cada máquina (sin contar los de las submáquinas
+    que llama) y la cantidad de llamadas a cada una se acumulan solo al
+    entrar y salir de submáquinas, en ``pasos_maquina`` y ``llamadas``,
+    indexados como ``programa.maquinas``.
+
+    Con ``atajos`` las llamadas al Incrementador y al Decrementador se
+    resuelven con ``contadores`` en lugar de recorrer su tabla; con
+    ``validar`` igual a ``n``, una de cada ``n`` de esas llamadas se repite
+    además con la tabla sobre una copia de la cinta y cualquier diferencia
+    levanta ``RuntimeError``.
+
+    Con ``puntos`` (unos ``PuntosDeControl``) se guarda una instantánea al
+    empezar y luego cada ``puntos.intervalo`` pasos.
+
+    Con ``limites`` (unos ``Limites``) la corrida levanta
+    ``EjecucionAbortada`` al pasar el máximo de pasos o de segundos (el
+    reloj se mira cada ``INTERVALO_CONTROL`` pasos), o, con ``ciclos``,
+    cuando en esos controles la configuración completa (estado, pila,
+    cabezal y cinta) vuelve a una ya vista, lo que significa que la
+    máquina no va a terminar. Los ciclos se buscan con el método de Brent,
+    guardando una sola configuración.
+
+    Con ``observador`` (un ``Observador``) la corrida se hace de a un paso,
+    sin barridos ni atajos, avisándole cada transición; sin él los bucles
+    no hacen ninguna comprobación extra. Para seguir una corrida sin
+    frenarla se usan ``avisos`` (unos ``Avisos``), que se atienden con el
+    mismo umbral de pasos que los puntos de control y los límites, igual
+    que el ``control`` (un ``Control``) que permite pausarla o cancelarla.
+    """
+
+    def __init__(self, programa, cinta, cabezal=0, memoria=None, atajos=True, validar=0,
+                 puntos=None, limites=None, observador=None, avisos=None, control=None):
+        self.programa = programa
+        self.memoria = memoria
+        self.atajos = atajos
+        self.validar = validar
+        self.atajos_usados = 0
+        self.cinta = Cinta(cinta)
+        self.cabezal = cabezal
+        self.estado = programa.estado_inicial
+        self.pila = []
+        self.pasos = 0
+        self.terminada = False
+        self.pasos_maquina = [0] * len(programa.maquinas)
+        self.llamadas = [0] * len(programa.maquinas)
+        self.llamadas[0] = 1
+        self._marca = 0
+        self.puntos = puntos
+        self.limites = limites
+        self._proximo_punto = 0 if puntos is not None else _NUNCA
+        self._proximo_control = _NUNCA
+        self._limite_pasos = _NUNCA
+        self._fin = None
+        if limites is not None:
+            if limites.pasos is not None:
+                self._limite_pasos = limites.pasos + 1
+            if limites.segundos is not None:
+                self._fin = time.monotonic() + limites.segundos
+            if limites.segundos is not None or limites.ciclos:
+                self._proximo_control = INTERVALO_CONTROL
+        # método de Brent: configuración guardada, controles desde entonces y tope
+        self._guardada = None
+        self._vistas = 0
+        self._tope = 1
+        self.avisos = avisos
+        # por cada aviso periódico, [próximo paso o vencimiento, intervalo, función]
+        self._por_pasos = []
+        self._por_tiempo = []
+        self._proximo_aviso = _NUNCA
+        self._proximo_reloj = _NUNCA
+        if avisos is not None:
+            self._por_pasos = [[pasos, pasos, funcion] for pasos, funcion in avisos.por_pasos]
+            ahora = time.monotonic()
+            self._por_tiempo = [[ahora + segundos, segundos, funcion]
+                                for segundos, funcion in avisos.por_tiempo]
+            self._programar_avisos()
+        self.control = None
+        self._proximo_pausa = _NUNCA
+        # hasta qué paso corre ``correr`` con una tanda
+        self._hasta = _NUNCA
+        self.controlar(control)
+        self.observador = observador
+        if observador is not None:
+            observador.entrar(self, programa.maquinas[0].nombre)
+
+    def resultado(self):
+        return Resultado(str(self.cinta), self.pasos, self.programa.nombres_estado[self.estado][1])
+
+    def pasos_por_maquina(self):
+        """Pasos propios de cada máquina que se ejecutó, por nombre."""
+        return {maquina.nombre: pasos
+                for maquina, pasos in zip(self.programa.maquinas, self.pasos_maquina) if pasos}
+
+    def llamadas_por_maquina(self):
+        """Cantidad de veces que se entró a cada máquina, por nombre."""
+        return {maquina.nombre: llamadas
+                for maquina, llamadas in zip(self.programa.maquinas, self.llamadas) if llamadas}
+
+    def restaurar(self, punto):
+        """Vuelve la ejecución al estado guardado en un ``Punto``."""
+        self.pasos = punto.pasos
+        self.estado = punto.estado
+        self.cabezal = punto.cabezal
+        self.pila = list(punto.pila)
+        self.cinta.restaurar(punto.cinta)
+        self.pasos_maquina = list(punto.pasos_maquina)
+        self.llamadas = list(punto.llamadas)
+        self._marca = punto.marca
+        self.terminada = punto.terminada
+        if self.puntos is not None:
+            self._proximo_punto = self.puntos.proximo(self.pasos)
+        if self._proximo_control != _NUNCA:
+            self._proximo_control = self.pasos + INTERVALO_CONTROL
+        self._guardada = None
+        for aviso in self._por_pasos:
+            aviso[0] = self.pasos + aviso[1]
+        self._programar_avisos()
+        self.controlar(self.control)
+
+    def controlar(self, control):
+        """Cambia el ``Control`` de la ejecución (None lo quita); no mientras corre."""
+        self.control = control
+        self._proximo_pausa = _NUNCA if control is None else self.pasos + INTERVALO_PAUSA
+        self._proximo = self._umbral()
+
+    def _umbral(self):
+        return min(self._proximo_punto, self._proximo_control, self._limite_pasos,
+                   self._proximo_aviso, self._proximo_reloj, self._proximo_pausa, self._hasta)
+
+    def _programar_avisos(self):
+        self._proximo_aviso = min((aviso[0] for aviso in self._por_pasos), default=_NUNCA)
+        if self._por_tiempo:
+            self._proximo_reloj = self.pasos + INTERVALO_RELOJ
+
+    def _avisar(self):
+        """Llama a los avisos periódicos vencidos."""
+        pasos = self.pasos
+        for aviso in self._por_pasos:
+            if pasos >= aviso[0]:
+                aviso[0] = pasos + aviso[1]
+                aviso[2](self)
+        if pasos >= self._proximo_reloj:
+            ahora = time.monotonic()
+            for aviso in self._por_tiempo:
+                if ahora >= aviso[0]:
+                    aviso[0] = ahora + aviso[1]
+                    aviso[2](self)
+        self._programar_avisos()
+
+    def _avisar_llamada(self, funciones, estado):
+        nombre = self.programa.nombres_estado[estado][0]
+        for funcion in funciones:
+            funcion(self, nombre)
+
+    def _avisar_fin(self):
+        if self.avisos is not None:
+            for funcion in self.avisos.finales:
+                funcion(self)
+
+    def _evento(self):
+        """Atiende lo que estaba previsto para este paso y devuelve el próximo umbral."""
+        pasos = self.pasos
+        if pasos >= self._proximo_punto:
+            self.puntos.tomar(self)
+            self._proximo_punto = self.puntos.proximo(pasos)
+        if pasos >= self._limite_pasos:
+            raise self._abortar("pasos")
+        if pasos >= self._proximo_pausa:
+            control = self.control
+            if control.pausado:
+                pausa = time.monotonic()
+                control.esperar()
+                # el tiempo en pausa no cuenta para el límite de segundos
+                if self._fin is not None:
+                    self._fin += time.monotonic() - pausa
+            if control.cancelado:
+                raise self._abortar("cancelada")
+            self._proximo_pausa = pasos + INTERVALO_PAUSA
+        if pasos >= self._proximo_control:
+            if self._fin is not None and time.monotonic() > self._fin:
+                raise self._abortar("segundos")
+            if self.limites.ciclos:
+                self._buscar_ciclo()
+            self._proximo_control = pasos + INTERVALO_CONTROL
+        if pasos >= self._proximo_aviso or pasos >= self._proximo_reloj:
+            self._avisar()
+        return self._umbral()
+
+    def _configuracion(self):
+        inicio, contenido = self.cinta.instantanea()
+        # los blancos de los bordes no cambian lo que hace la máquina
+        recortado = contenido.strip(b" ")
+        desplazamiento = inicio + contenido.index(recortado) if recortado else 0
+        return (self.estado, tuple(self.pila), self.cabezal - desplazamiento, recortado)
+
+    def _buscar_ciclo(self):
+        configuracion = self._configuracion()
+        if configuracion == self._guardada:
+            raise self._abortar("ciclo")
+        self._vistas += 1
+        if self._guardada is None or self._vistas == self._tope:
+            self._guardada = configuracion
+            self._vistas = 0
+            self._tope *= 2
+
+    def llamadas_en_curso(self):
+        """Nombres de las máquinas de la pila de llamadas, desde la principal."""
+        nombres = self.programa.nombres_estado
+        return [nombres[estado][0] for estado in self.pila] + [nombres[self.estado][0]]
+
+    def _abortar(self, motivo):
+        maquina, estado = self.programa.nombres_estado[self.estado]
+        return EjecucionAbortada(motivo, maquina, estado, tuple(self.llamadas_en_curso()),
+                                 self.pasos, self.cabezal)
+
+    def avanzar(self, n=1):
+        """Da exactamente ``n`` pasos de a uno (sin barridos ni atajos).
+
+        Se detiene antes si la máquina principal termina; devuelve los
+        pasos dados. El estado queda justo después de la última
+        transición, sin aplicar los regresos de submáquina pendientes. Si
+        hay observador, se le avisa cada transición, llamada y regreso.
+        """
+        observador = self.observador
+        programa = self.programa
+        tabla = programa.tabla
+        maquina_de_estado = programa.maquina_de_estado
+        nombres = programa.nombres_estado
+        entradas = self.avisos.entradas if self.avisos is not None else ()
+        salidas = self.avisos.salidas if self.avisos is not None else ()
+        cinta = self.cinta
+        dados = 0
+        while dados < n and not self.terminada:
+            if self.pasos >= self._proximo:
+                self._proximo = self._evento()
+            estado = self.estado
+            leido = cinta.celdas[cinta.origen + self.cabezal]
+            entrada = tabla[estado * ANCHO + CODIGOS[leido]]
+            if entrada is None:
+                self.pasos_maquina[maquina_de_estado[estado]] += self.pasos - self._marca
+                self._marca = self.pasos
+                if observador is not None:
+                    observador.salir(self, nombres[estado][0])
+                if not self.pila:
+                    self.terminada = True
+                    if observador is not None:
+                        observador.terminar(self)
+                    self._avisar_fin()
+                else:
+                    if salidas:
+                        self._avisar_llamada(salidas, estado)
+                    self.estado = self.pila.pop()
+                continue
+
+            if observador is not None:
+                observador.transicion(self, nombres[estado][1], chr(leido))
+            nuevo_estado, escribir, mover, destino = entrada
+            if escribir >= 0:
+                cinta.celdas[cinta.origen + self.cabezal] = escribir
+            self.pasos += 1
+            dados += 1
+            if mover == LLAMADA:
+                self.pasos_maquina[maquina_de_estado[estado]] += self.pasos - self._marca
+                self._marca = self.pasos
+                self.llamadas[maquina_de_estado[destino]] += 1
+                self.pila.append(nuevo_estado)
+                self.estado = destino
+                if observador is not None:
+                    observador.entrar(self, nombres[destino][0])
+                if entradas:
+                    self._avisar_llamada(entradas, destino)
+                continue
+            if mover == BARRIDO:
+                mover = R if destino.derecha else L
+            self.estado = nuevo_estado
+            self.cabezal += mover
+            if not cinta.inicio <= self.cabezal < cinta.fin:
+                cinta.extender(self.cabezal)
+        return dados
+
+    def correr(self, tanda=None):
+        """Ejecuta hasta que la máquina principal se detiene y devuelve True.
+
+        Con ``tanda`` se detiene antes, en cuanto dio al menos esa cantidad
+        de pasos (un barrido o un atajo puede pasarse), y devuelve False si
+        la máquina todavía no terminó; otra llamada sigue desde ahí.
+        """
+        if self.terminada:
+            return True
+        if self.observador is not None:
+            # con observador se va de a un paso para avisarle cada transición
+            self.avanzar(_NUNCA if tanda is None else tanda)
+            return self.terminada
+        self._hasta = _NUNCA if tanda is None else self.pasos + tanda
+        self._proximo = self._umbral()
+        tabla = self.programa.tabla
+        maquina_de_estado = self.programa.maquina_de_estado
+        atajos = self.programa.atajos if self.atajos else ()
+        validar = self.validar
+        hojas = self.programa.hojas if self.memoria is not None else ()
+        descartadas = self.memoria.descartadas if self.memoria is not None else ()
+        entradas = self.avisos.entradas if self.avisos is not None else ()
+        salidas = self.avisos.salidas if self.avisos is not None else ()
+        pasos_maquina = self.pasos_maquina
+        llamadas = self.llamadas
+        marca = self._marca
+        codigos = CODIGOS
+        cinta = self.cinta
+        cabezal = self.cabezal
+        estado = self.estado
+        pila = self.pila
+        pasos = self.pasos
+        celdas = cinta.celdas
+        origen, inicio, fin = cinta.origen, cinta.inicio, cinta.fin
+        proximo = self._proximo
+
+        # si un límite, un aviso o el control cortan la corrida con una excepción, el
+        # umbral de la tanda no debe quedar para las corridas siguientes
+        try:
+            while True:
+                if pasos >= proximo:
+                    self.cabezal, self.estado, self.pasos, self._marca = cabezal, estado, pasos, marca
+                    if pasos >= self._hasta:
+                        break
+                    proximo = self._evento()
+                entrada = tabla[estado * ANCHO + codigos[celdas[origen + cabezal]]]
+                if entrada is None:
+                    # fin de la máquina actual: se vuelve a la que la llamó
+                    pasos_maquina[maquina_de_estado[estado]] += pasos - marca
+                    marca = pasos
+                    if not pila:
+                        self.terminada = True
+                        break
+                    if salidas:
+                        self.cabezal, self.estado, self.pasos, self._marca = cabezal, estado, pasos, marca
+                        self._avisar_llamada(salidas, estado)
+                    estado = pila.pop()
+                    continue
+                estado, escribir, mover, destino = entrada
+                if escribir >= 0:
+                    celdas[origen + cabezal] = escribir
+
+                if mover == BARRIDO:
+                    # cuenta un paso por cada celda recorrida
+                    if destino.derecha:
+                        i = destino.buscar(celdas, origen + cabezal, origen + fin)
+                        nuevo = i - origen if i >= 0 else fin
+                        pasos += nuevo - cabezal
+                    else:
+                        i = destino.buscar(celdas, origen + cabezal, origen + inicio)
+                        nuevo = i - origen if i >= 0 else inicio - 1
+                        pasos += cabezal - nuevo
+                    cabezal = nuevo
+                    if not inicio <= cabezal < fin:
+                        cinta.extender(cabezal)
+                        celdas = cinta.celdas
+                        origen, inicio, fin = cinta.origen, cinta.inicio, cinta.fin
+                    continue
+
+                pasos += 1
+                if mover == R:
+                    cabezal += 1
+                    if cabezal == fin:
+                        cinta.extender(cabezal)
+                        celdas, fin = cinta.celdas, cinta.fin
+                elif mover == L:
+                    cabezal -= 1
+                    if cabezal < inicio:
+                        cinta.extender(cabezal)
+                        celdas, origen, inicio = cinta.celdas, cinta.origen, cinta.inicio
+                elif mover == LLAMADA:
+                    pasos_maquina[maquina_de_estado[estado]] += pasos - marca
+                    marca = pasos
+                    sub = maquina_de_estado[destino]
+                    llamadas[sub] += 1
+                    if entradas:
+                        self.cabezal, self.estado, self.pasos, self._marca = cabezal, destino, pasos, marca
+                        self._avisar_llamada(entradas, destino)
+                    atajo = atajos[sub] if atajos else None
+                    if atajo is not None or hojas and hojas[sub] and sub not in descartadas:
+                        if atajo is None:
+                            cabezal, sub_pasos = self._llamar_hoja(sub, destino, cabezal)
+                        elif validar:
+                            cabezal, sub_pasos = self._llamar_atajo(atajo, destino, cabezal)
+                        else:
+                            cabezal, sub_pasos = atajo(cinta, cabezal)
+                        pasos += sub_pasos
+                        pasos_maquina[sub] += sub_pasos
+                        marca = pasos
+                        celdas = cinta.celdas
+                        origen, inicio, fin = cinta.origen, cinta.inicio, cinta.fin
+                        if salidas:
+                            self.cabezal, self.estado, self.pasos, self._marca = cabezal, destino, pasos, marca
+                            self._avisar_llamada(salidas, destino)
+                    else:
+                        pila.append(estado)
+                        estado = destino
+        finally:
+            self._hasta = _NUNCA
+            self._proximo = min(proximo, self._umbral())
+
+        self.cabezal, self.estado, self.pasos = cabezal, estado, pasos
+        self._marca = marca
+        if self.terminada:
+            self._avisar_fin()
+        return self.terminada
+
+    def _llamar_atajo(self, atajo, estado, cabezal):
+        """Ejecuta un atajo y, una de cada ``validar`` veces, lo compara con la tabla."""
+        self.atajos_usados += 1
+        if self.atajos_usados % self.validar:
+            return atajo(self.cinta, cabezal)
+
+        copia = self.cinta.copiar()
+        esperado = self._simular_hoja(estado, cabezal, copia)[:2]
+        obtenido = atajo(self.cinta, cabezal)
+        if obtenido != esperado or self.cinta.instantanea() != copia.instantanea():
+            nombre = self.programa.nombres_estado[estado][0]
+            raise RuntimeError(
+                f"{nombre}: el atajo difiere de la tabla con el cabezal en {cabezal}: "
+                f"(cabezal, pasos) {obtenido} en vez de {esperado}, "
+                f"cinta {str(self.cinta)!r} en vez de {str(copia)!r}")
+        return obtenido
+
+    def _llamar_hoja(self, maquina, estado, cabezal):
+        """Ejecuta una llamada a una submáquina hoja usando ``self.memoria``.
+
+        Devuelve la nueva posición del cabezal y los pasos de la llamada.
+        """
+        cinta = self.cinta
+        memoria = self.memoria
+        repeticion = memoria.buscar(maquina, cinta, cabezal)
+        if repeticion is not None:
+            desde, salida, desplazamiento, pasos = repeticion
+            cinta.escribir(cabezal + desde, salida)
+            return cabezal + desplazamiento, pasos
+
+        final, pasos, minimo, maximo, originales = self._simular_hoja(estado, cabezal)
+        salida = cinta.leer(minimo, maximo + 1)
+        antes = bytearray(salida)
+        for posicion, byte in originales.items():
+            antes[posicion - minimo] = byte
+        memoria.guardar(maquina, minimo - cabezal, maximo - cabezal, bytes(antes), salida,
+                        final - cabezal, pasos)
+        return final, pasos
+
+    def _simular_hoja(self, estado, cabezal, cinta=None):
+        """Ejecuta una submáquina hoja registrando las posiciones visitadas.
+
+        Devuelve ``(cabezal, pasos, minimo, maximo, originales)``, donde
+        ``originales`` tiene el byte previo de cada celda escrita. Trabaja
+        sobre ``cinta`` si se da, y si no sobre la de la ejecución.
+        """
+        tabla = self.programa.tabla
+        codigos = CODIGOS
+        cinta = self.cinta if cinta is None else cinta
+        celdas = cinta.celdas
+        origen, inicio, fin = cinta.origen, cinta.inicio, cinta.fin
+        pasos = 0
+        minimo = maximo = cabezal
+        originales = {}
+
+        while True:
+            entrada = tabla[estado * ANCHO + codigos[celdas[origen + cabezal]]]
+            if entrada is None:
+                break
+            estado, escribir, mover, destino = entrada
+            if escribir >= 0:
+                if cabezal not in originales:
+                    originales[cabezal] = celdas[origen + cabezal]
+                celdas[origen + cabezal] = escribir
+
+            if mover == BARRIDO:
+                if destino.derecha:
+                    i = destino.buscar(celdas, origen + cabezal, origen + fin)
+                    nuevo = i - origen if i >= 0 else fin
+                else:
+                    i = destino.buscar(celdas, origen + cabezal, origen + inicio)
+                    nuevo = i - origen if i >= 0 else inicio - 1
+                pasos += abs(nuevo - cabezal)
+                cabezal = nuevo
+            else:
+                pasos += 1
+                cabezal += mover
+
+            if cabezal < minimo:
+                minimo = cabezal
+            elif cabezal > maximo:
+                maximo = cabezal
+            if not inicio <= cabezal < fin:
+                cinta.extender(cabezal)
+                celdas = cinta.celdas
+                origen, inicio, fin = cinta.origen, cinta.inicio, cinta.fin
+
+        return cabezal, pasos, minimo, maximo, originales
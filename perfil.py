@@ -0,0 +1,99 @@
+"""Perfil de una ejecución paso a paso, por submáquina y por transición.
+
+Un ``Perfil`` es un ``motor.Observador``: se pasa como ``observador`` a una
+``Ejecucion``, que entonces corre de a un paso. Por cada máquina acumula pasos
+propios, llamadas y tiempo inclusivo (con sus submáquinas) y exclusivo
+(sin ellas); además cuenta cuántas veces se ejecutó cada transición
+``(máquina, estado, símbolo)`` y cuántos pasos se dieron en cada pila de
+llamadas, que se exporta en el formato "colapsado" de los flamegraphs:
+
+    Iniciador;Multiplicador;SumadorInicio;Incrementador 5821
+
+Sin observador la ejecución no paga nada por el perfil.
+"""
+
+import json
+import time
+from collections import Counter
+
+from motor import Observador
+
+
+class Perfil(Observador):
+    """Acumula el perfil de una o varias ejecuciones."""
+
+    def __init__(self):
+        self.pasos = Counter()
+        self.llamadas = Counter()
+        self.inclusivo = Counter()
+        self.exclusivo = Counter()
+        self.transiciones = Counter()
+        self.pasos_pila = Counter()
+        self.tiempo_pila = Counter()
+        # cada marco es [nombre, pila, inicio, tiempo de las submáquinas]
+        self._marcos = []
+
+    def entrar(self, ejecucion, nombre):
+        """Registra el comienzo de una llamada a la máquina ``nombre``."""
+        pila = self._marcos[-1][1] + (nombre,) if self._marcos else (nombre,)
+        self.llamadas[nombre] += 1
+        self._marcos.append([nombre, pila, time.perf_counter(), 0.0])
+
+    def salir(self, ejecucion, nombre):
+        """Registra el final de la llamada en curso."""
+        nombre, pila, inicio, hijos = self._marcos.pop()
+        total = time.perf_counter() - inicio
+        # una máquina que aparece más de una vez en la pila solo suma su
+        # tiempo inclusivo en la llamada más externa
+        if nombre not in pila[:-1]:
+            self.inclusivo[nombre] += total
+        self.exclusivo[nombre] += total - hijos
+        self.tiempo_pila[pila] += total - hijos
+        if self._marcos:
+            self._marcos[-1][3] += total
+
+    def transicion(self, ejecucion, estado, simbolo):
+        """Cuenta un paso de la máquina en curso con la transición ``(estado, simbolo)``."""
+        nombre, pila = self._marcos[-1][:2]
+        self.pasos[nombre] += 1
+        self.pasos_pila[pila] += 1
+        self.transiciones[nombre, estado, simbolo] += 1
+
+    def maquinas(self):
+        """Resumen por máquina: pasos, llamadas y segundos inclusivos y exclusivos."""
+        return {nombre: {"pasos": self.pasos[nombre],
+                         "llamadas": self.llamadas[nombre],
+                         "inclusivo": round(self.inclusivo[nombre], 6),
+                         "exclusivo": round(self.exclusivo[nombre], 6)}
+                for nombre, _ in self.exclusivo.most_common()}
+
+    def calientes(self, cantidad=None):
+        """Las ``cantidad`` transiciones más ejecutadas, como ``(máquina, estado, símbolo, veces)``."""
+        return [clave + (veces,) for clave, veces in self.transiciones.most_common(cantidad)]
+
+    def a_dict(self):
+        return {
+            "maquinas": self.maquinas(),
+            "transiciones": [{"maquina": maquina, "estado": estado, "simbolo": simbolo, "veces": veces}
+                             for maquina, estado, simbolo, veces in self.calientes()],
+            "pilas": {";".join(pila): pasos for pila, pasos in self.pasos_pila.most_common()},
+        }
+
+    def guardar_json(self, ruta):
+        with open(ruta, "w") as archivo:
+            json.dump(self.a_dict(), archivo, indent=1, ensure_ascii=False)
+
+    def guardar_colapsado(self, ruta, medida="pasos"):
+        """Escribe una línea ``pila valor`` por pila de llamadas.
+
+        ``medida`` es ``"pasos"`` (pasos propios de la pila) o ``"tiempo"``
+        (microsegundos exclusivos).
+        """
+        if medida == "pasos":
+            valores = self.pasos_pila
+        else:
+            valores = {pila: round(segundos * 1e6) for pila, segundos in self.tiempo_pila.items()}
+        with open(ruta, "w") as archivo:
+            for pila, valor in sorted(valores.items()):
+                if valor:
+                    archivo.write(f"{';'.join(pila)} {valor}\n")
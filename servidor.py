@@ -0,0 +1,391 @@
+"""Servicio HTTP/JSON local de cálculos, con un pool de procesos y carga de prueba.
+
+Los pedidos llegan por ``POST /calcular`` con un trabajo como los de
+``flujo`` (``num1``, ``num2``, ``operador`` y campos extra que se devuelven
+tal cual) o una lista de trabajos, y opcionalmente ``max_pasos`` y
+``max_segundos`` para ese trabajo, que no pueden pasar los límites del
+servidor. La respuesta es el registro de ``flujo.a_registro`` de cada uno,
+con ``latencia``: los segundos desde que el pedido entró a la cola.
+
+Los trabajos esperan en una cola acotada: si no hay lugar para todos los
+de un pedido se rechaza entero con 503 y ``Retry-After``. Un despachador
+los manda en bloques a un pool de procesos que compilan el programa una
+sola vez al iniciar, con a lo sumo ``2 * procesos`` bloques en vuelo; con
+poca carga cada trabajo sale solo, y cuando los procesos están ocupados
+los que esperan se juntan en bloques de hasta ``tam_bloque``.
+``GET /estado`` devuelve las estadísticas del servicio.
+
+    python servidor.py servir --puerto 8765 -p 4
+    curl -d '{"num1": 12, "num2": 5, "operador": "*"}' localhost:8765/calcular
+    python servidor.py carga --puerto 8765 -n 5000 -c 32
+"""
+
+import argparse
+import functools
+import http.client
+import json
+import math
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from calculadora import OPERADORES, calcular, motor_compartido
+from flujo import a_registro, validar_trabajo
+from lotes import MAX_PASOS, MAX_SEGUNDOS
+from motor import Limites
+
+HOST = "127.0.0.1"
+PUERTO = 8765
+# bytes máximos del cuerpo de un pedido; de sobra para una cola llena de trabajos
+MAX_CUERPO = 1 << 20
+
+
+class ColaLlena(Exception):
+    """No hay lugar en la cola del servicio para todos los trabajos del pedido."""
+
+
+class ServicioCerrado(Exception):
+    """El servicio se cerró antes de calcular el trabajo."""
+
+
+def _evaluar(bloque):
+    return [calcular(num1, num2, operador, limites=limites)
+            for num1, num2, operador, limites in bloque]
+
+
+class Servicio:
+    """Cola acotada de cálculos que se despacha en bloques a un pool de procesos.
+
+    ``capacidad`` es el máximo de trabajos aceptados y todavía sin
+    resultado (en la cola o en el pool). ``limites`` (unos
+    ``motor.Limites``) son los máximos de cada cálculo; siempre se cortan
+    los ciclos.
+    """
+
+    def __init__(self, procesos=None, capacidad=1024, tam_bloque=32, limites=None):
+        self.procesos = procesos or os.cpu_count() or 1
+        self.capacidad = capacidad
+        self.tam_bloque = tam_bloque
+        self.limites = (limites or Limites())._replace(ciclos=True)
+        self.aceptados = 0
+        self.atendidos = 0
+        self.rechazados = 0
+        self.bloques = 0
+        self._pendientes = deque()
+        self._en_curso = 0
+        self._en_vuelo = 0
+        self._cerrado = False
+        self._cond = threading.Condition()
+        self._pool = ProcessPoolExecutor(self.procesos, initializer=motor_compartido)
+        self._despachador = threading.Thread(target=self._despachar, daemon=True)
+        self._despachador.start()
+
+    def pedido(self, trabajo):
+        """``(num1, num2, operador, limites)`` de un trabajo; ValueError si no es válido."""
+        validar_trabajo(trabajo)
+        num1, num2, operador = trabajo["num1"], trabajo["num2"], trabajo["operador"]
+        limites = self.limites
+        if trabajo.get("max_pasos") is not None:
+            pasos = _limite(trabajo["max_pasos"], "max_pasos", int)
+            limites = limites._replace(pasos=_menor(limites.pasos, pasos))
+        if trabajo.get("max_segundos") is not None:
+            segundos = _limite(trabajo["max_segundos"], "max_segundos", (int, float))
+            limites = limites._replace(segundos=_menor(limites.segundos, float(segundos)))
+        return int(num1), int(num2), operador, limites
+
+    def encolar(self, pedidos):
+        """Encola los pedidos y devuelve un ``Future`` por cada uno con su ``Calculo``.
+
+        Levanta ``ColaLlena`` sin encolar ninguno si no entran todos.
+        """
+        futuros = [Future() for _ in pedidos]
+        with self._cond:
+            if self._cerrado or self._en_curso + len(pedidos) > self.capacidad:
+                self.rechazados += len(pedidos)
+                raise ColaLlena()
+            self._en_curso += len(pedidos)
+            self.aceptados += len(pedidos)
+            self._pendientes.extend(zip(pedidos, futuros))
+            self._cond.notify_all()
+        return futuros
+
+    def _despachar(self):
+        maximo = 2 * self.procesos
+        while True:
+            with self._cond:
+                while not self._cerrado and (not self._pendientes or self._en_vuelo >= maximo):
+                    self._cond.wait()
+                if self._cerrado:
+                    return
+                # los que esperan se reparten entre los lugares libres del pool
+                libres = maximo - self._en_vuelo
+                cantidad = min(self.tam_bloque, math.ceil(len(self._pendientes) / libres))
+                bloque = [self._pendientes.popleft() for _ in range(cantidad)]
+                self._en_vuelo += 1
+                self.bloques += 1
+            try:
+                futuro = self._pool.submit(_evaluar, [pedido for pedido, _ in bloque])
+            except RuntimeError:
+                # el pool se cerró mientras se armaba el bloque
+                futuro = Future()
+                futuro.set_exception(ServicioCerrado())
+            futuro.add_done_callback(functools.partial(self._entregar, bloque))
+
+    def _entregar(self, bloque, futuro):
+        try:
+            calculos = futuro.result()
+        except BaseException as e:
+            if futuro.cancelled():
+                e = ServicioCerrado()
+            for _, resultado in bloque:
+                resultado.set_exception(e)
+        else:
+            for (_, resultado), calculo in zip(bloque, calculos):
+                resultado.set_result(calculo)
+        with self._cond:
+            self._en_curso -= len(bloque)
+            self._en_vuelo -= 1
+            self.atendidos += len(bloque)
+            self._cond.notify_all()
+
+    def estadisticas(self):
+        with self._cond:
+            return {"procesos": self.procesos, "capacidad": self.capacidad,
+                    "en_curso": self._en_curso, "en_cola": len(self._pendientes),
+                    "aceptados": self.aceptados, "atendidos": self.atendidos,
+                    "rechazados": self.rechazados, "bloques": self.bloques,
+                    "limites": self.limites._asdict()}
+
+    def cerrar(self):
+        """Deja de aceptar trabajos; los que no terminaron fallan con ``ServicioCerrado``."""
+        with self._cond:
+            self._cerrado = True
+            pendientes = list(self._pendientes)
+            self._pendientes.clear()
+            self._en_curso -= len(pendientes)
+            self._cond.notify_all()
+        for _, resultado in pendientes:
+            resultado.set_exception(ServicioCerrado())
+        self._pool.shutdown(cancel_futures=True)
+
+
+def _limite(valor, campo, tipos):
+    if isinstance(valor, bool) or not isinstance(valor, tipos) or not 0 <= valor < math.inf:
+        raise ValueError(f"{campo} debe ser un número no negativo")
+    return valor
+
+
+def _menor(limite, pedido):
+    return pedido if limite is None else min(limite, pedido)
+
+
+class _Manejador(BaseHTTPRequestHandler):
+    # conexiones persistentes para que la carga de prueba no mida el handshake,
+    # y sin Nagle para que el cuerpo, escrito aparte de los encabezados, no
+    # espere al ACK demorado del cliente
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def _responder(self, codigo, cuerpo, encabezados=()):
+        datos = json.dumps(cuerpo, ensure_ascii=False).encode("utf-8")
+        self.send_response(codigo)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(datos)))
+        for nombre, valor in encabezados:
+            self.send_header(nombre, valor)
+        self.end_headers()
+        self.wfile.write(datos)
+
+    def do_GET(self):
+        if self.path != "/estado":
+            self._responder(404, {"error": "no existe"})
+            return
+        self._responder(200, self.server.servicio.estadisticas())
+
+    def do_POST(self):
+        try:
+            largo = int(self.headers.get("Content-Length", 0))
+        except ValueError:
+            largo = -1
+        if not 0 <= largo <= MAX_CUERPO:
+            # el cuerpo no se lee, así que la conexión no puede seguir
+            self.close_connection = True
+            if largo < 0:
+                self._responder(400, {"error": "Content-Length inválido"})
+            else:
+                self._responder(413, {"error": f"el cuerpo pasa los {MAX_CUERPO} bytes"})
+            return
+        datos = self.rfile.read(largo)
+        if self.path != "/calcular":
+            self._responder(404, {"error": "no existe"})
+            return
+        servicio = self.server.servicio
+        try:
+            cuerpo = json.loads(datos)
+            trabajos = cuerpo if isinstance(cuerpo, list) else [cuerpo]
+            pedidos = [servicio.pedido(trabajo) for trabajo in trabajos]
+        except (TypeError, ValueError, OverflowError) as e:
+            self._responder(400, {"error": str(e)})
+            return
+
+        inicio = time.perf_counter()
+        try:
+            futuros = servicio.encolar(pedidos)
+        except ColaLlena:
+            self._responder(503, {"error": "la cola está llena"}, [("Retry-After", "1")])
+            return
+        registros = []
+        try:
+            for trabajo, futuro in zip(trabajos, futuros):
+                registro = a_registro(trabajo, futuro.result())
+                registro["latencia"] = round(time.perf_counter() - inicio, 6)
+                registros.append(registro)
+        except ServicioCerrado:
+            self._responder(503, {"error": "el servicio se está cerrando"})
+            return
+        except Exception as e:
+            # un proceso caído o un resultado que no se pudo traer
+            self._responder(500, {"error": f"{type(e).__name__}: {e}"})
+            return
+        self._responder(200, registros if isinstance(cuerpo, list) else registros[0])
+
+    def log_message(self, formato, *args):
+        pass
+
+
+def crear_servidor(servicio, host=HOST, puerto=PUERTO):
+    """``ThreadingHTTPServer`` que atiende ``servicio``; con puerto 0 elige uno libre."""
+    servidor = ThreadingHTTPServer((host, puerto), _Manejador)
+    servidor.daemon_threads = True
+    servidor.servicio = servicio
+    return servidor
+
+
+def _percentil(ordenados, proporcion):
+    if not ordenados:
+        return None
+    return ordenados[max(0, math.ceil(proporcion * len(ordenados)) - 1)]
+
+
+def carga(host=HOST, puerto=PUERTO, pedidos=1000, concurrencia=16, lote=1, bits=6, semilla=0):
+    """Manda ``pedidos`` pedidos desde ``concurrencia`` clientes y mide el servicio.
+
+    Cada pedido lleva ``lote`` cálculos al azar con operandos de hasta
+    ``bits`` bits. Devuelve cálculos por segundo, percentiles de latencia
+    de los pedidos atendidos en milisegundos y la cantidad de rechazados.
+    """
+    azar = random.Random(semilla)
+    cuerpos = deque()
+    for _ in range(pedidos):
+        trabajos = [{"num1": azar.randint(1, (1 << bits) - 1), "num2": azar.randint(1, (1 << bits) - 1),
+                     "operador": azar.choice(OPERADORES)} for _ in range(lote)]
+        cuerpos.append(json.dumps(trabajos if lote > 1 else trabajos[0]))
+    latencias = []
+    contadores = {"rechazados": 0, "errores": 0}
+    lock = threading.Lock()
+
+    def cliente():
+        conexion = http.client.HTTPConnection(host, puerto)
+        while True:
+            try:
+                cuerpo = cuerpos.popleft()
+            except IndexError:
+                break
+            inicio = time.perf_counter()
+            conexion.request("POST", "/calcular", cuerpo, {"Content-Type": "application/json"})
+            respuesta = conexion.getresponse()
+            respuesta.read()
+            latencia = time.perf_counter() - inicio
+            with lock:
+                if respuesta.status == 200:
+                    latencias.append(latencia)
+                elif respuesta.status == 503:
+                    contadores["rechazados"] += 1
+                else:
+                    contadores["errores"] += 1
+        conexion.close()
+
+    inicio = time.perf_counter()
+    clientes = [threading.Thread(target=cliente) for _ in range(concurrencia)]
+    for hilo in clientes:
+        hilo.start()
+    for hilo in clientes:
+        hilo.join()
+    segundos = time.perf_counter() - inicio
+
+    latencias.sort()
+    milisegundos = {nombre: round(_percentil(latencias, p) * 1000, 3) if latencias else None
+                    for nombre, p in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99), ("max", 1.0))}
+    return {"pedidos": pedidos, "atendidos": len(latencias), **contadores,
+            "calculos_por_segundo": round(len(latencias) * lote / segundos, 1),
+            "segundos": round(segundos, 3), "latencia_ms": milisegundos}
+
+
+def _agregar_servicio(parser):
+    parser.add_argument("-p", "--procesos", type=int, default=None,
+                        help="procesos del pool (por defecto, uno por núcleo)")
+    parser.add_argument("--cola", type=int, default=1024,
+                        help="trabajos aceptados sin resultado antes de responder 503")
+    parser.add_argument("-b", "--bloque", type=int, default=32,
+                        help="máximo de trabajos por bloque enviado a un proceso")
+    parser.add_argument("--max-pasos", type=int, default=MAX_PASOS,
+                        help="máximo de pasos de cada cálculo")
+    parser.add_argument("--max-segundos", type=float, default=MAX_SEGUNDOS,
+                        help="máximo de segundos de cada cálculo")
+
+
+def _servicio(args):
+    return Servicio(args.procesos, args.cola, args.bloque,
+                    Limites(args.max_pasos, args.max_segundos))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servicio HTTP local de la calculadora")
+    comandos = parser.add_subparsers(dest="comando", required=True)
+
+    servir_parser = comandos.add_parser("servir", help="atiende pedidos en localhost")
+    servir_parser.add_argument("--puerto", type=int, default=PUERTO)
+    _agregar_servicio(servir_parser)
+
+    carga_parser = comandos.add_parser("carga", help="mide rendimiento y latencia de un servidor")
+    carga_parser.add_argument("--puerto", type=int, default=PUERTO)
+    carga_parser.add_argument("-n", "--pedidos", type=int, default=1000)
+    carga_parser.add_argument("-c", "--concurrencia", type=int, default=16,
+                              help="clientes enviando pedidos a la vez")
+    carga_parser.add_argument("--lote", type=int, default=1, help="cálculos por pedido")
+    carga_parser.add_argument("--bits", type=int, default=6, help="largo máximo de los operandos")
+    carga_parser.add_argument("--semilla", type=int, default=0)
+    carga_parser.add_argument("--local", action="store_true",
+                              help="levanta un servidor propio en un puerto libre y lo mide")
+    _agregar_servicio(carga_parser)
+    args = parser.parse_args()
+
+    if args.comando == "servir":
+        servicio = _servicio(args)
+        servidor = crear_servidor(servicio, puerto=args.puerto)
+        print(f"Atendiendo en http://{HOST}:{args.puerto} con {servicio.procesos} procesos")
+        try:
+            servidor.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            servidor.server_close()
+            servicio.cerrar()
+    else:
+        servidor = servicio = None
+        puerto = args.puerto
+        if args.local:
+            servicio = _servicio(args)
+            servidor = crear_servidor(servicio, puerto=0)
+            puerto = servidor.server_address[1]
+            threading.Thread(target=servidor.serve_forever, daemon=True).start()
+        informe = carga(HOST, puerto, args.pedidos, args.concurrencia, args.lote, args.bits, args.semilla)
+        if servicio is not None:
+            informe["servicio"] = servicio.estadisticas()
+            servidor.shutdown()
+            servicio.cerrar()
+        print(json.dumps(informe, indent=1, ensure_ascii=False))
@@ -638,3 +638,22 @@ transiciones_iniciador = {
     ('s20',' '):('s21','n','N'),
 
 }
+
+
+# nombre de llamada -> (nombre, transiciones, estado inicial, estado final)
+maquinas = {
+    "I": ("Incrementador", transiciones_incrementador, "s0", "s2"),
+    "D": ("Decrementador", transiciones_decrementador, "s0", "s2"),
+    "CaR": ("CopiarEnResultado", transiciones_copiar_en_resultado, "s0", "s9"),
+    "MR": ("MoverResultado", transiciones_mover_resultado, "s0", "s6"),
+    "CaP": ("CopiarAlInicio", transiciones_copiar_al_inicio, "s0", "s12"),
+    "RO": ("RecargarOperador", transiciones_recargar_operador, "s0", "s16"),
+    "S": ("Sumador", transiciones_sumador, "s2", "s11"),
+    "X": ("Restador", transiciones_restador, "s2", "s11"),
+    "M": ("Multiplicador", transiciones_multiplicador, "s0", "s30"),
+    "Div": ("Divisor", transiciones_divisor, "s0", "s40"),
+    "SI": ("SumadorInicio", transiciones_sumador_inicio, "s0", "s11"),
+    "XI": ("RestadorInicio", transiciones_restador_inicio, "s0", "s11"),
+}
+
+iniciador = ("Iniciador", transiciones_iniciador, "s0", "s21")
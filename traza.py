@@ -0,0 +1,293 @@
+"""Trazas binarias de una ejecución, paso a paso, y su reproducción.
+
+Cada paso se guarda como un registro de ancho fijo ``REGISTRO``:
+máquina, estado local, posición del cabezal, byte leído, byte escrito y
+movimiento (``R``, ``L``, ``N`` o ``LLAMADA``). Los registros se escriben
+en bloques de ``registros_por_bloque``, opcionalmente comprimidos con
+zlib, así que grabar usa memoria acotada y leer un paso solo descomprime
+su bloque.
+
+Formato del archivo::
+
+    MAGIA, flags (1 = zlib), registros por bloque       "<4sBI"
+    largo del encabezado JSON, JSON                      "<I" + datos
+    bloques: cantidad de registros, bytes, datos         "<II" + datos
+    bloque vacío (0, 0) y cierre: cabezal, máquina,
+    estado y pasos finales                               "<iHHq"
+
+El encabezado JSON guarda la cinta inicial y los nombres de las máquinas y
+de sus estados. Como cada registro tiene el byte leído y el escrito, la
+cinta de cualquier paso se reconstruye aplicando las escrituras hacia
+adelante o deshaciéndolas hacia atrás, sin volver a simular.
+
+    python traza.py grabar 12 5 '*' -o calculo.trz -z
+    python traza.py ver calculo.trz --paso 1000
+"""
+
+import argparse
+import json
+import struct
+import zlib
+
+from cinta import Cinta
+from compilador import ANCHO, BARRIDO, CODIGOS, LLAMADA, L, R
+
+MAGIA = b"TRZ1"
+COMPRIMIDA = 1
+
+_CABECERA = struct.Struct("<4sBI")
+_LARGO = struct.Struct("<I")
+_BLOQUE = struct.Struct("<II")
+_CIERRE = struct.Struct("<iHHq")
+
+# máquina, estado, cabezal, leído, escrito, movimiento
+REGISTRO = struct.Struct("<HHiBBb")
+
+
+class Grabador:
+    """Escribe registros de pasos en un archivo de traza.
+
+    Se usa como context manager o llamando a ``cerrar`` con el estado
+    final; hasta entonces el archivo no tiene cierre y no puede leerse.
+    """
+
+    def __init__(self, ruta, programa, cinta, cabezal=0, comprimir=False, registros_por_bloque=4096):
+        self.comprimir = comprimir
+        self.registros_por_bloque = registros_por_bloque
+        self.registros = 0
+        self._archivo = open(ruta, "wb")
+        self._buffer = bytearray(REGISTRO.size * registros_por_bloque)
+        self._en_buffer = 0
+
+        encabezado = json.dumps({
+            "cinta": str(cinta),
+            "cabezal": cabezal,
+            "maquinas": [maquina.nombre for maquina in programa.maquinas],
+            "estados": [list(maquina.estados) for maquina in programa.maquinas],
+        }).encode("utf-8")
+        self._archivo.write(_CABECERA.pack(MAGIA, COMPRIMIDA if comprimir else 0, registros_por_bloque))
+        self._archivo.write(_LARGO.pack(len(encabezado)) + encabezado)
+
+    def registrar(self, maquina, estado, cabezal, leido, escrito, mover):
+        REGISTRO.pack_into(self._buffer, self._en_buffer * REGISTRO.size,
+                           maquina, estado, cabezal, leido, escrito, mover)
+        self._en_buffer += 1
+        if self._en_buffer == self.registros_por_bloque:
+            self._volcar()
+
+    def _volcar(self):
+        if not self._en_buffer:
+            return
+        datos = bytes(self._buffer[:self._en_buffer * REGISTRO.size])
+        if self.comprimir:
+            datos = zlib.compress(datos)
+        self._archivo.write(_BLOQUE.pack(self._en_buffer, len(datos)) + datos)
+        self.registros += self._en_buffer
+        self._en_buffer = 0
+
+    def cerrar(self, cabezal=0, maquina=0, estado=0):
+        if self._archivo.closed:
+            return
+        self._volcar()
+        self._archivo.write(_BLOQUE.pack(0, 0))
+        self._archivo.write(_CIERRE.pack(cabezal, maquina, estado, self.registros))
+        self._archivo.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excepcion):
+        self._archivo.close()
+
+
+def grabar(programa, contenido, ruta, cabezal=0, comprimir=False):
+    """Ejecuta ``programa`` sobre ``contenido`` paso a paso grabando la traza en ``ruta``.
+
+    No usa atajos ni resuelve los barridos de una vez, para que haya un
+    registro por paso; devuelve la cantidad de pasos.
+    """
+    tabla = programa.tabla
+    maquina_de_estado = programa.maquina_de_estado
+    desplazamientos = programa.desplazamientos
+    cinta = Cinta(contenido)
+    estado = programa.estado_inicial
+    pila = []
+
+    with Grabador(ruta, programa, cinta, cabezal, comprimir) as grabador:
+        registrar = grabador.registrar
+        while True:
+            leido = cinta.celdas[cinta.origen + cabezal]
+            entrada = tabla[estado * ANCHO + CODIGOS[leido]]
+            if entrada is None:
+                if not pila:
+                    break
+                estado = pila.pop()
+                continue
+            nuevo_estado, escribir, mover, destino = entrada
+            maquina = maquina_de_estado[estado]
+            escrito = leido if escribir < 0 else escribir
+            cinta.celdas[cinta.origen + cabezal] = escrito
+            if mover == BARRIDO:
+                # un barrido se graba como un paso por celda
+                mover = R if destino.derecha else L
+            registrar(maquina, estado - desplazamientos[maquina], cabezal, leido, escrito, mover)
+
+            if mover == LLAMADA:
+                pila.append(nuevo_estado)
+                estado = destino
+                continue
+            estado = nuevo_estado
+            cabezal += mover
+            if not cinta.inicio <= cabezal < cinta.fin:
+                cinta.extender(cabezal)
+
+        maquina = maquina_de_estado[estado]
+        grabador.cerrar(cabezal, maquina, estado - desplazamientos[maquina])
+        return grabador.registros
+
+
+class Traza:
+    """Lectura de un archivo de traza con acceso por número de paso."""
+
+    def __init__(self, ruta):
+        self._archivo = open(ruta, "rb")
+        magia, flags, self.registros_por_bloque = _CABECERA.unpack(self._leer(_CABECERA.size))
+        if magia != MAGIA:
+            self._archivo.close()
+            raise ValueError(f"{ruta}: no es un archivo de traza")
+        self.comprimida = bool(flags & COMPRIMIDA)
+        (largo,) = _LARGO.unpack(self._leer(_LARGO.size))
+        encabezado = json.loads(self._leer(largo))
+
+        self.cinta_inicial = encabezado["cinta"]
+        self.cabezal_inicial = encabezado["cabezal"]
+        self.maquinas = encabezado["maquinas"]
+        self.estados = encabezado["estados"]
+
+        # solo se recorre la cabecera de cada bloque; los datos se leen al pedirlos
+        self._bloques = []
+        while True:
+            cantidad, tamano = _BLOQUE.unpack(self._leer(_BLOQUE.size))
+            if not cantidad:
+                break
+            self._bloques.append((self._archivo.tell(), tamano))
+            self._archivo.seek(tamano, 1)
+        self.cabezal_final, maquina, estado, self.pasos = _CIERRE.unpack(self._leer(_CIERRE.size))
+        self.estado_final = (self.maquinas[maquina], self.estados[maquina][estado])
+        self._cache = (None, None)
+
+    def _leer(self, tamano):
+        datos = self._archivo.read(tamano)
+        if len(datos) != tamano:
+            raise ValueError(f"{self._archivo.name}: traza incompleta")
+        return datos
+
+    def cerrar(self):
+        self._archivo.close()
+
+    def __len__(self):
+        return self.pasos
+
+    def _bloque(self, numero):
+        if self._cache[0] != numero:
+            posicion, tamano = self._bloques[numero]
+            self._archivo.seek(posicion)
+            datos = self._leer(tamano)
+            if self.comprimida:
+                datos = zlib.decompress(datos)
+            self._cache = (numero, datos)
+        return self._cache[1]
+
+    def __getitem__(self, paso):
+        """Registro ``(maquina, estado, cabezal, leido, escrito, mover)`` del paso dado."""
+        if not 0 <= paso < self.pasos:
+            raise IndexError(paso)
+        numero, indice = divmod(paso, self.registros_por_bloque)
+        return REGISTRO.unpack_from(self._bloque(numero), indice * REGISTRO.size)
+
+    def nombres(self, registro):
+        """``(máquina, estado)`` por nombre de un registro."""
+        return self.maquinas[registro[0]], self.estados[registro[0]][registro[1]]
+
+
+class Reproductor:
+    """Recorre una ``Traza`` hacia adelante o hacia atrás.
+
+    ``paso`` es la cantidad de pasos aplicados; ``cinta``, ``cabezal``,
+    ``nombre`` y ``estado`` describen la máquina antes de dar el paso
+    ``paso`` (o el final, si ya se aplicaron todos). Moverse cuesta un
+    registro por paso recorrido.
+    """
+
+    def __init__(self, traza):
+        self.traza = traza
+        self.cinta = Cinta(traza.cinta_inicial)
+        self.paso = 0
+        self._actualizar()
+
+    def _actualizar(self):
+        traza = self.traza
+        if self.paso < traza.pasos:
+            registro = traza[self.paso]
+            self.cabezal = registro[2]
+            self.nombre, self.estado = traza.nombres(registro)
+        else:
+            self.cabezal = traza.cabezal_final
+            self.nombre, self.estado = traza.estado_final
+
+    def ir(self, paso):
+        """Lleva la reproducción al paso dado."""
+        paso = max(0, min(paso, self.traza.pasos))
+        cinta = self.cinta
+        while self.paso < paso:
+            _, _, cabezal, _, escrito, mover = self.traza[self.paso]
+            cinta.extender(cabezal)
+            cinta.celdas[cinta.origen + cabezal] = escrito
+            if mover != LLAMADA:
+                cinta.extender(cabezal + mover)
+            self.paso += 1
+        while self.paso > paso:
+            self.paso -= 1
+            _, _, cabezal, leido, _, _ = self.traza[self.paso]
+            cinta.celdas[cinta.origen + cabezal] = leido
+        self._actualizar()
+
+    def avanzar(self, pasos=1):
+        self.ir(self.paso + pasos)
+
+    def retroceder(self, pasos=1):
+        self.ir(self.paso - pasos)
+
+
+if __name__ == "__main__":
+    from calculadora import OPERADORES, crear_cinta, motor_compartido
+
+    parser = argparse.ArgumentParser(description="Graba y reproduce trazas de ejecución")
+    comandos = parser.add_subparsers(dest="comando", required=True)
+
+    grabar_parser = comandos.add_parser("grabar", help="ejecuta un cálculo grabando su traza")
+    grabar_parser.add_argument("num1")
+    grabar_parser.add_argument("num2")
+    grabar_parser.add_argument("operador", choices=OPERADORES)
+    grabar_parser.add_argument("-o", "--salida", required=True, help="archivo de traza")
+    grabar_parser.add_argument("-z", "--comprimir", action="store_true", help="comprime los bloques con zlib")
+
+    ver_parser = comandos.add_parser("ver", help="muestra la máquina en un paso de una traza")
+    ver_parser.add_argument("archivo")
+    ver_parser.add_argument("--paso", type=int, default=None, help="paso a mostrar (por defecto el final)")
+    ver_parser.add_argument("--ventana", type=int, default=30, help="celdas a cada lado del cabezal")
+    args = parser.parse_args()
+
+    if args.comando == "grabar":
+        cinta = crear_cinta(args.num1, args.num2, args.operador)
+        pasos = grabar(motor_compartido().programa, cinta, args.salida, comprimir=args.comprimir)
+        print(f"{pasos} pasos grabados en {args.salida}")
+    else:
+        traza = Traza(args.archivo)
+        reproductor = Reproductor(traza)
+        reproductor.ir(traza.pasos if args.paso is None else args.paso)
+        desde = reproductor.cabezal - args.ventana
+        celdas = reproductor.cinta.leer(desde, reproductor.cabezal + args.ventana + 1).decode("ascii")
+        print(f"Paso {reproductor.paso} de {traza.pasos}  {reproductor.nombre} {reproductor.estado}")
+        print(celdas)
+        print(" " * args.ventana + "^")